@@ -1,4 +1,4 @@
 """
 缓存相关模块
-包含缓存管理器、缓存工厂和Redis缓存管理器
+包含缓存管理器、缓存工厂、Redis缓存管理器、进程内内存缓存和缓存值压缩
 """
\ No newline at end of file
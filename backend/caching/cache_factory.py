@@ -5,6 +5,7 @@
 通过配置文件或环境变量控制
 """
 import os
+import threading
 from typing import Union
 from utils.logger import get_logger
 
@@ -73,13 +74,21 @@ def _create_file_cache():
 
 # 全局缓存管理器实例 (懒加载)
 _cache_manager = None
+_cache_manager_lock = threading.Lock()
 
 def get_cache_manager():
     """
     获取全局缓存管理器实例
     单例模式，确保整个应用使用同一个缓存实例
+    
+    双重检查锁定：仅在首次创建时加锁，之后直接返回已创建的实例
     """
     global _cache_manager
-    if _cache_manager is None:
-        _cache_manager = create_cache_manager()
-    return _cache_manager
\ No newline at end of file
+    cache_manager = _cache_manager
+    if cache_manager is not None:
+        return cache_manager
+    
+    with _cache_manager_lock:
+        if _cache_manager is None:
+            _cache_manager = create_cache_manager()
+        return _cache_manager
\ No newline at end of file
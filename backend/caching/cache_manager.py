@@ -1,53 +1,147 @@
-import json
 import asyncio
-from typing import Any, Optional
-from datetime import datetime, timedelta
-import aiofiles
+import orjson
+from typing import Any, Dict, Iterable, Optional
+from datetime import datetime
 import os
+import time
 import hashlib
+import functools
+import tempfile
 from utils.logger import get_logger
+from caching.memory_cache import MemoryCache
+from caching.compression import compress, decompress
 
 logger = get_logger(__name__)
 
+# 新格式缓存文件的后缀：过期时间同时记录在文件修改时间上（0 表示永不过期）
+_CACHE_SUFFIX = '.cache'
+# 旧格式缓存文件的后缀：文件名为 MD5 或未标记修改时间格式，当前不会再被查找，清理时直接删除
+_LEGACY_SUFFIX = '.json'
+
+@functools.lru_cache(maxsize=4096)
+def _hash_key(key: str) -> str:
+    """计算缓存键的哈希（热点键重复访问时直接命中，无需重新计算）"""
+    # 文件名只需在缓存键之间不冲突，不需要密码学强度；blake2b 比 MD5 更快且同为 128 位
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+
+_HEX_DIGITS = frozenset('0123456789abcdef')
+
+def _is_hex_hash(name: str) -> bool:
+    """文件名是否为 32 位小写十六进制哈希"""
+    return len(name) == 32 and _HEX_DIGITS.issuperset(name)
+
+def _read_bytes(path: str) -> bytes:
+    """同步读取文件内容"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _write_bytes(path: str, payload: bytes, mtime: float) -> None:
+    """
+    同步写入文件内容并设置修改时间
+    
+    先写入同目录下的临时文件再原子替换，读取方不会看到写了一半的文件
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.utime(tmp_path, (time.time(), mtime))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
 class CacheManager:
-    def __init__(self, cache_dir: str = "cache"):
+    def __init__(self, cache_dir: str = "cache", memory_cache_size: int = 512, memory_cache_ttl: int = 300,
+                 cleanup_interval: Optional[int] = 300):
         self.cache_dir = cache_dir
+        # 后台定期清理过期文件的间隔（秒），None 表示不启用
+        self.cleanup_interval = cleanup_interval
+        self._cleanup_task: Optional[asyncio.Task] = None
+        # 进程内一级缓存：热点键在有效期内直接命中，不再读取磁盘
+        # ttl 限制了其他进程修改文件后本进程可能读到旧值的时间
+        self._memory_cache = MemoryCache(maxsize=memory_cache_size, ttl=memory_cache_ttl)
         self.ensure_cache_dir()
     
     def ensure_cache_dir(self):
-        """确保缓存目录存在"""
-        if not os.path.exists(self.cache_dir):
-            os.makedirs(self.cache_dir)
+        """确保缓存目录及 256 个分桶子目录存在"""
+        for bucket in range(256):
+            os.makedirs(os.path.join(self.cache_dir, f'{bucket:02x}'), exist_ok=True)
+        self._remove_flat_legacy_files()
+    
+    def _remove_flat_legacy_files(self):
+        """
+        删除旧版直接存放在缓存目录下的缓存文件
+        
+        旧版文件名是缓存键的 MD5，当前按 blake2b 查找，这些文件永远不会再被命中
+        """
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                stem = entry.name[:-len(_LEGACY_SUFFIX)]
+                # 只处理文件名为 32 位十六进制哈希的缓存文件，其他文件保持不动
+                if not entry.name.endswith(_LEGACY_SUFFIX) or not _is_hex_hash(stem):
+                    continue
+                try:
+                    if entry.is_file():
+                        os.remove(entry.path)
+                except OSError as e:
+                    # 单个文件删除失败不影响启动
+                    logger.warning(f"删除旧版缓存文件失败 {entry.name}: {str(e)}")
     
     def _get_cache_path(self, key: str) -> str:
         """获取缓存文件路径"""
-        # 使用MD5哈希作为文件名，避免特殊字符问题
-        key_hash = hashlib.md5(key.encode('utf-8')).hexdigest()
-        return os.path.join(self.cache_dir, f"{key_hash}.json")
+        # 使用键的哈希作为文件名，避免特殊字符问题
+        # 按哈希前两位分到 256 个子目录，避免单个目录下文件过多导致目录操作变慢
+        key_hash = _hash_key(key)
+        return os.path.join(self.cache_dir, key_hash[:2], key_hash + _CACHE_SUFFIX)
+    
+    @staticmethod
+    def _to_timestamp(expire_time: Any) -> Optional[float]:
+        """将过期时间统一转换为时间戳（兼容旧版ISO格式字符串）"""
+        if isinstance(expire_time, str):
+            return datetime.fromisoformat(expire_time).timestamp()
+        return expire_time
     
     async def get(self, key: str) -> Optional[Any]:
         """获取缓存数据"""
         try:
+            data = self._memory_cache.get(key)
+            if data is not None:
+                logger.debug(f"内存缓存命中: {key}")
+                return data
+            
             cache_path = self._get_cache_path(key)
             
-            if not os.path.exists(cache_path):
+            # 直接打开文件，不存在时由异常处理，避免额外的 exists 检查
+            # 缓存文件通常只有几KB，一次线程切换完成 open/read/close
+            try:
+                content = await asyncio.to_thread(_read_bytes, cache_path)
+            except FileNotFoundError:
                 return None
             
-            async with aiofiles.open(cache_path, 'r', encoding='utf-8') as f:
-                content = await f.read()
-                cache_data = json.loads(content)
+            try:
+                cache_data = orjson.loads(decompress(content))
+            except ValueError:
+                # 文件损坏，删除它
+                logger.warning(f"缓存文件损坏 {key}")
+                await self._delete_cache_file(cache_path)
+                return None
             
             # 检查是否过期
-            expire_time = cache_data.get('expire_time')
-            if expire_time:
-                expire_datetime = datetime.fromisoformat(expire_time)
-                if datetime.now() > expire_datetime:
-                    # 缓存已过期，删除文件
-                    await self._delete_cache_file(cache_path)
-                    return None
+            expire_time = self._to_timestamp(cache_data.get('expire_time'))
+            if expire_time and time.time() > expire_time:
+                # 缓存已过期，删除文件
+                await self._delete_cache_file(cache_path)
+                return None
+            
+            data = cache_data.get('data')
+            self._memory_cache.set(key, data, expire_time - time.time() if expire_time else None)
             
             logger.debug(f"缓存命中: {key}")
-            return cache_data.get('data')
+            return data
             
         except Exception as e:
             logger.error(f"读取缓存失败 {key}: {str(e)}")
@@ -58,18 +152,17 @@ class CacheManager:
         try:
             cache_path = self._get_cache_path(key)
             
+            now = time.time()
             cache_data = {
                 'data': data,
-                'created_time': datetime.now().isoformat(),
-                'expire_time': None
+                'created_time': now,
+                'expire_time': now + expire if expire else None
             }
             
-            if expire:
-                expire_time = datetime.now() + timedelta(seconds=expire)
-                cache_data['expire_time'] = expire_time.isoformat()
-            
-            async with aiofiles.open(cache_path, 'w', encoding='utf-8') as f:
-                await f.write(json.dumps(cache_data, ensure_ascii=False, indent=2))
+            # 将过期时间同时记录在文件修改时间上（0 表示永不过期），清理时只需 stat 无需读取文件
+            await asyncio.to_thread(_write_bytes, cache_path, compress(orjson.dumps(cache_data)), cache_data['expire_time'] or 0)
+            self._memory_cache.set(key, data, expire)
+            self._ensure_cleanup_task()
             
             logger.debug(f"缓存设置: {key}")
             return True
@@ -78,53 +171,131 @@ class CacheManager:
             logger.error(f"设置缓存失败 {key}: {str(e)}")
             return False
     
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Optional[Any]]:
+        """批量获取缓存数据，未命中的键对应 None"""
+        keys = list(keys)
+        values = await asyncio.gather(*(self.get(key) for key in keys))
+        return dict(zip(keys, values))
+    
+    async def set_many(self, items: Dict[str, Any], expire: Optional[int] = None) -> bool:
+        """批量设置缓存数据"""
+        results = await asyncio.gather(*(self.set(key, data, expire) for key, data in items.items()))
+        return all(results)
+    
     async def delete(self, key: str) -> bool:
         """删除缓存数据"""
         try:
+            self._memory_cache.delete(key)
             cache_path = self._get_cache_path(key)
             return await self._delete_cache_file(cache_path)
         except Exception as e:
             logger.error(f"删除缓存失败 {key}: {str(e)}")
             return False
     
+    async def invalidate(self, keys: Iterable[str]) -> bool:
+        """
+        删除一组缓存
+        
+        文件缓存由同一主机上的进程共享，其他进程的内存缓存条目会在 memory_cache_ttl 内过期
+        """
+        # 大部分键可能本就不存在，delete 返回 False 不视为失败
+        results = await asyncio.gather(*(self.delete(key) for key in keys))
+        logger.debug(f"缓存失效: 删除 {sum(results)}/{len(results)} 个键")
+        return True
+    
     async def _delete_cache_file(self, cache_path: str) -> bool:
         """删除缓存文件"""
+        return self._remove_file(cache_path)
+    
+    @staticmethod
+    def _remove_file(cache_path: str) -> bool:
+        """同步删除缓存文件，文件不存在或删除失败返回 False"""
         try:
-            if os.path.exists(cache_path):
-                os.remove(cache_path)
-                return True
+            os.remove(cache_path)
+            return True
+        except FileNotFoundError:
             return False
         except Exception as e:
             logger.error(f"删除缓存文件失败 {cache_path}: {str(e)}")
             return False
     
-    async def clear_expired(self) -> int:
-        """清理过期的缓存文件"""
+    def _read_expire_time(self, cache_path: str) -> Optional[float]:
+        """同步读取缓存文件中的过期时间戳"""
+        return self._to_timestamp(orjson.loads(decompress(_read_bytes(cache_path))).get('expire_time'))
+    
+    @staticmethod
+    def _valid_by_mtime(entry: os.DirEntry, now: float) -> bool:
+        """
+        仅凭目录项判断缓存文件是否一定未过期
+        
+        只有新格式文件的修改时间记录了过期时间；复制或恢复时未保留修改时间的
+        文件，修改时间看起来像已过期，需读取内容确认；旧格式文件总是视为过期
+        """
+        if not entry.name.endswith(_CACHE_SUFFIX):
+            return False
+        mtime = entry.stat().st_mtime
+        return mtime == 0 or mtime > now
+    
+    def _sweep_file(self, path: str) -> bool:
+        """读取文件内容确认是否过期，过期或损坏时删除；已删除返回 True"""
+        try:
+            expire_time = self._read_expire_time(path)
+        except FileNotFoundError:
+            return False
+        except ValueError:
+            # 文件损坏
+            return self._remove_file(path)
+        
+        if expire_time and time.time() > expire_time:
+            return self._remove_file(path)
+        # 修改时间丢失的文件：恢复为记录的过期时间，之后的清理无需再读取
+        try:
+            os.utime(path, (time.time(), expire_time or 0))
+        except OSError:
+            pass
+        return False
+    
+    def _list_cache_files(self) -> list:
+        """列出缓存目录下所有分桶子目录中的缓存文件"""
+        # os.scandir 一次性返回目录项，避免逐个拼接路径和额外的 stat 调用
+        files = []
+        with os.scandir(self.cache_dir) as buckets:
+            for bucket in buckets:
+                if not bucket.is_dir():
+                    continue
+                with os.scandir(bucket.path) as entries:
+                    files.extend(entry for entry in entries
+                                 if entry.name.endswith((_CACHE_SUFFIX, _LEGACY_SUFFIX)))
+        return files
+    
+    def _sweep_expired(self) -> int:
+        """遍历缓存目录并删除过期文件（同步，在线程中执行）"""
         cleared_count = 0
+        now = time.time()
+        for entry in self._list_cache_files():
+            if entry.name.endswith(_LEGACY_SUFFIX):
+                # 旧格式文件不会再被查找，直接删除
+                cleared_count += self._remove_file(entry.path)
+                continue
+            try:
+                valid = self._valid_by_mtime(entry, now)
+            except FileNotFoundError:
+                # 其他进程已删除该文件
+                continue
+            if not valid:
+                cleared_count += self._sweep_file(entry.path)
+        return cleared_count
+    
+    async def clear_expired(self) -> int:
+        """
+        清理过期的缓存文件
         
+        新格式文件的过期时间记录在修改时间上，未过期的文件仅凭目录项即可跳过；
+        修改时间显示已过期的文件读取内容确认后再删除，旧格式文件直接删除。
+        遍历 256 个分桶目录的文件系统操作在线程中执行，不阻塞事件循环
+        """
         try:
-            for filename in os.listdir(self.cache_dir):
-                if filename.endswith('.json'):
-                    cache_path = os.path.join(self.cache_dir, filename)
-                    
-                    try:
-                        async with aiofiles.open(cache_path, 'r', encoding='utf-8') as f:
-                            content = await f.read()
-                            cache_data = json.loads(content)
-                        
-                        expire_time = cache_data.get('expire_time')
-                        if expire_time:
-                            expire_datetime = datetime.fromisoformat(expire_time)
-                            if datetime.now() > expire_datetime:
-                                await self._delete_cache_file(cache_path)
-                                cleared_count += 1
-                    
-                    except Exception as e:
-                        logger.warning(f"检查缓存文件失败 {cache_path}: {str(e)}")
-                        # 如果文件损坏，也删除它
-                        await self._delete_cache_file(cache_path)
-                        cleared_count += 1
-            
+            cleared_count = await asyncio.to_thread(self._sweep_expired)
             logger.info(f"清理了 {cleared_count} 个过期缓存文件")
             return cleared_count
             
@@ -132,6 +303,44 @@ class CacheManager:
             logger.error(f"清理过期缓存失败: {str(e)}")
             return 0
     
+    def _ensure_cleanup_task(self):
+        """首次写入时启动后台清理任务（需要在事件循环中调用）"""
+        if self.cleanup_interval and self._cleanup_task is None:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+    
+    async def _cleanup_loop(self):
+        """定期清理过期缓存文件，保持缓存目录大小有界"""
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            await self.clear_expired()
+    
+    async def close(self):
+        """停止后台清理任务，在应用关闭时调用"""
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            try:
+                await self._cleanup_task
+            except asyncio.CancelledError:
+                pass
+            self._cleanup_task = None
+    
+    def _collect_stats(self, stats: dict) -> None:
+        """遍历缓存目录统计文件（同步，在线程中执行）"""
+        now = time.time()
+        for entry in self._list_cache_files():
+            try:
+                size = entry.stat().st_size
+                valid = self._valid_by_mtime(entry, now)
+            except FileNotFoundError:
+                continue
+            stats['total_files'] += 1
+            stats['total_size'] += size
+            # 与清理相同的判断：仅凭修改时间无法确认有效的文件计为过期
+            if valid:
+                stats['valid_files'] += 1
+            else:
+                stats['expired_files'] += 1
+    
     async def get_cache_stats(self) -> dict:
         """获取缓存统计信息"""
         stats = {
@@ -142,30 +351,7 @@ class CacheManager:
         }
         
         try:
-            for filename in os.listdir(self.cache_dir):
-                if filename.endswith('.json'):
-                    cache_path = os.path.join(self.cache_dir, filename)
-                    stats['total_files'] += 1
-                    stats['total_size'] += os.path.getsize(cache_path)
-                    
-                    try:
-                        async with aiofiles.open(cache_path, 'r', encoding='utf-8') as f:
-                            content = await f.read()
-                            cache_data = json.loads(content)
-                        
-                        expire_time = cache_data.get('expire_time')
-                        if expire_time:
-                            expire_datetime = datetime.fromisoformat(expire_time)
-                            if datetime.now() > expire_datetime:
-                                stats['expired_files'] += 1
-                            else:
-                                stats['valid_files'] += 1
-                        else:
-                            stats['valid_files'] += 1
-                    
-                    except Exception:
-                        stats['expired_files'] += 1
-            
+            await asyncio.to_thread(self._collect_stats, stats)
             return stats
             
         except Exception as e:
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+缓存值压缩
+超过阈值的序列化结果使用 zstd 压缩，文件缓存和 Redis 缓存共用
+"""
+try:
+    import zstandard as zstd
+except ImportError:  # zstd 为可选依赖，未安装时只写入未压缩数据
+    zstd = None
+
+# 首字节标记：Z 表示 zstd 压缩，R 表示未压缩
+_MARK_ZSTD = b'Z'
+_MARK_RAW = b'R'
+
+# 小于该字节数的数据压缩收益很小，直接原样存储
+COMPRESS_THRESHOLD = 1024
+
+if zstd is not None:
+    _compressor = zstd.ZstdCompressor(level=3)
+    _decompressor = zstd.ZstdDecompressor()
+
+
+def compress(payload: bytes) -> bytes:
+    """为序列化后的数据添加标记字节，超过阈值时进行 zstd 压缩"""
+    if zstd is not None and len(payload) > COMPRESS_THRESHOLD:
+        return _MARK_ZSTD + _compressor.compress(payload)
+    return _MARK_RAW + payload
+
+
+def decompress(payload: bytes) -> bytes:
+    """
+    还原 compress 写入的数据
+
+    没有标记字节的数据视为旧版未压缩格式，原样返回。
+    解压失败时抛出 ValueError，由调用方按缓存损坏处理。
+    """
+    marker = payload[:1]
+    if marker == _MARK_RAW:
+        return payload[1:]
+    if marker == _MARK_ZSTD:
+        if zstd is None:
+            raise ValueError("缓存数据使用 zstd 压缩，但未安装 zstandard")
+        try:
+            return _decompressor.decompress(payload[1:])
+        except zstd.ZstdError as e:
+            raise ValueError(f"zstd 解压失败: {str(e)}")
+    return payload
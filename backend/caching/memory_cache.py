@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+进程内内存缓存
+带容量上限（LRU淘汰）和过期时间的轻量字典缓存，作为文件/Redis缓存前的一级缓存
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class MemoryCache:
+    """
+    LRU + 过期时间的进程内缓存
+
+    所有操作均为同步方法且不包含 await，在单线程事件循环中天然是原子的，无需加锁。
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: Optional[float] = None):
+        """
+        Args:
+            maxsize: 最大条目数，超出后淘汰最久未使用的条目
+            ttl: 条目最长存活时间（秒），None 表示仅受调用方传入的过期时间约束
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """获取缓存值，未命中或已过期返回 None"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        value, expire_at = item
+        if expire_at is not None and time.time() > expire_at:
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, expire: Optional[float] = None) -> None:
+        """
+        设置缓存值
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            expire: 过期时间（秒），与 ttl 取较小者
+        """
+        if self.ttl is not None:
+            expire = self.ttl if expire is None else min(expire, self.ttl)
+        expire_at = time.time() + expire if expire is not None else None
+
+        self._data[key] = (value, expire_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> bool:
+        """删除缓存值"""
+        return self._data.pop(key, None) is not None
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
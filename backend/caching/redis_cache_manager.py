@@ -2,20 +2,54 @@
 """
 Redis 缓存管理器
 """
-import json
 import asyncio
-from typing import Any, Optional
+import functools
+import time
+import msgpack
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 import redis.asyncio as redis
 from utils.logger import get_logger
+from caching.memory_cache import MemoryCache
+from caching.compression import compress, decompress
 
 logger = get_logger(__name__)
 
+# datetime 的 msgpack 扩展类型编码：以微秒时间戳存储，避免与字符串相互转换
+_EXT_NAIVE_DATETIME = 1
+_EXT_UTC_DATETIME = 2
+
+def _pack_ext(obj: Any) -> msgpack.ExtType:
+    """将 datetime 编码为扩展类型（无时区的按本地时间处理，带时区的统一转换为 UTC）"""
+    if isinstance(obj, datetime):
+        code = _EXT_NAIVE_DATETIME if obj.tzinfo is None else _EXT_UTC_DATETIME
+        micros = round(obj.timestamp() * 1_000_000)
+        return msgpack.ExtType(code, micros.to_bytes(8, 'big', signed=True))
+    raise TypeError(f"无法序列化类型: {type(obj).__name__}")
+
+def _unpack_ext(code: int, payload: bytes) -> Any:
+    """还原 _pack_ext 编码的扩展类型"""
+    if code in (_EXT_NAIVE_DATETIME, _EXT_UTC_DATETIME):
+        seconds = int.from_bytes(payload, 'big', signed=True) / 1_000_000
+        if code == _EXT_UTC_DATETIME:
+            return datetime.fromtimestamp(seconds, tz=timezone.utc)
+        return datetime.fromtimestamp(seconds)
+    return msgpack.ExtType(code, payload)
+
+def _unpack(payload: bytes) -> Any:
+    """解压并反序列化缓存数据"""
+    return msgpack.unpackb(decompress(payload), raw=False, ext_hook=_unpack_ext)
+
+# 复用同一个 Packer 实例，避免每次序列化都重新创建编码器（事件循环单线程使用，无需加锁）
+_packer = msgpack.Packer(use_bin_type=True, default=_pack_ext)
+
 class RedisCacheManager:
     """
     Redis 缓存管理器
     """
     
-    def __init__(self, redis_url: str = "redis://localhost:6379", db: int = 0, key_prefix: str = "lifetracer:"):
+    def __init__(self, redis_url: str = "redis://localhost:6379", db: int = 0, key_prefix: str = "lifetracer:",
+                 memory_cache_size: int = 512, memory_cache_ttl: int = 60):
         """
         初始化 Redis 缓存管理器
         
@@ -23,12 +57,27 @@ class RedisCacheManager:
             redis_url: Redis 连接 URL
             db: Redis 数据库编号 (0-15)
             key_prefix: 缓存键前缀，避免与其他应用冲突
+            memory_cache_size: 进程内一级缓存的最大条目数
+            memory_cache_ttl: 进程内一级缓存的最长存活时间（秒），
+                限制多进程部署时其他进程更新后本进程读到旧值的时间
         """
         self.redis_url = redis_url
         self.db = db
         self.key_prefix = key_prefix
+        # 键索引（有序集合，score 为过期时间戳），用于 O(1) 统计缓存条目数
+        self.index_key = f"{key_prefix}__index__"
+        # 失效通知频道：多进程部署时通知其他进程清除一级缓存中的对应条目
+        self.invalidation_channel = f"{key_prefix}__invalidate__"
+        # 预先编码的键前缀，并缓存最近生成的完整键，热点键无需重复拼接和编码
+        self._prefix_bytes = key_prefix.encode('utf-8')
+        self._make_key = functools.lru_cache(maxsize=4096)(
+            lambda key: self._prefix_bytes + key.encode('utf-8')
+        )
         self.redis = None
+        self._memory_cache = MemoryCache(maxsize=memory_cache_size, ttl=memory_cache_ttl)
         self._connection_lock = asyncio.Lock()
+        self._invalidation_callbacks: List[Callable[[List[str]], None]] = []
+        self._invalidation_task: Optional[asyncio.Task] = None
     
     async def _get_redis(self) -> redis.Redis:
         """
@@ -42,8 +91,7 @@ class RedisCacheManager:
                         self.redis = redis.from_url(
                             self.redis_url,
                             db=self.db,
-                            encoding="utf-8",
-                            decode_responses=True,
+                            decode_responses=False,
                             max_connections=20,  # 连接池大小
                             retry_on_timeout=True
                         )
@@ -55,12 +103,12 @@ class RedisCacheManager:
                         raise Exception(f"无法连接到 Redis: {str(e)}")
         return self.redis
     
-    def _get_cache_key(self, key: str) -> str:
+    def _get_cache_key(self, key: str) -> bytes:
         """
         生成完整的缓存键
         添加前缀避免键冲突
         """
-        return f"{self.key_prefix}{key}"
+        return self._make_key(key)
     
     async def get(self, key: str) -> Optional[Any]:
         """
@@ -73,6 +121,11 @@ class RedisCacheManager:
             缓存的数据，如果不存在或已过期返回 None
         """
         try:
+            data = self._memory_cache.get(key)
+            if data is not None:
+                logger.debug(f"内存缓存命中: {key}")
+                return data
+            
             redis = await self._get_redis()
             cache_key = self._get_cache_key(key)
             
@@ -85,10 +138,11 @@ class RedisCacheManager:
             
             # 反序列化数据
             try:
-                data = json.loads(cached_data)
+                data = _unpack(cached_data)
+                self._memory_cache.set(key, data)
                 logger.debug(f"缓存命中: {key}")
                 return data
-            except json.JSONDecodeError as e:
+            except (msgpack.UnpackException, ValueError) as e:
                 logger.warning(f"缓存数据格式错误 {key}: {str(e)}")
                 # 删除损坏的缓存
                 await redis.delete(cache_key)
@@ -116,25 +170,169 @@ class RedisCacheManager:
             
             # 序列化数据
             try:
-                serialized_data = json.dumps(data, ensure_ascii=False)
+                serialized_data = compress(_packer.pack(data))
             except (TypeError, ValueError) as e:
                 logger.error(f"数据序列化失败 {key}: {str(e)}")
                 return False
             
-            # 设置缓存，Redis 原生支持过期时间
+            # 设置缓存并更新键索引，通过 pipeline 一次往返完成
+            now = time.time()
+            pipe = redis.pipeline(transaction=False)
+            # SET ... EX 单条命令原子地设置值和过期时间
+            pipe.set(cache_key, serialized_data, ex=expire or None)
+            pipe.zadd(self.index_key, {cache_key: now + expire if expire else float('inf')})
+            # 顺带清理索引中已过期的成员，保持索引大小有界
+            pipe.zremrangebyscore(self.index_key, '-inf', now)
+            await pipe.execute()
+            
             if expire:
-                await redis.setex(cache_key, expire, serialized_data)
                 logger.debug(f"缓存设置 (过期时间: {expire}s): {key}")
             else:
-                await redis.set(cache_key, serialized_data)
                 logger.debug(f"缓存设置 (永久): {key}")
             
+            self._memory_cache.set(key, data, expire)
             return True
             
         except Exception as e:
             logger.error(f"设置缓存失败 {key}: {str(e)}")
             return False
     
+    async def get_with_ttl(self, key: str) -> Tuple[Optional[Any], int]:
+        """
+        获取缓存数据及其剩余过期时间，使用 pipeline 一次往返完成
+        
+        Args:
+            key: 缓存键
+            
+        Returns:
+            (缓存数据, 剩余秒数)。永不过期时剩余秒数为 -1，不存在时为 (None, -2)
+        """
+        try:
+            redis = await self._get_redis()
+            cache_key = self._get_cache_key(key)
+            
+            pipe = redis.pipeline(transaction=False)
+            pipe.get(cache_key)
+            pipe.ttl(cache_key)
+            cached_data, ttl = await pipe.execute()
+            
+            if cached_data is None:
+                return None, -2
+            
+            return _unpack(cached_data), ttl
+            
+        except Exception as e:
+            logger.error(f"读取缓存失败 {key}: {str(e)}")
+            return None, -2
+    
+    async def touch(self, key: str, expire: int) -> bool:
+        """
+        仅刷新缓存的过期时间，不重新传输和编码数据
+        
+        Args:
+            key: 缓存键
+            expire: 新的过期时间（秒）
+            
+        Returns:
+            键存在且刷新成功返回 True，否则返回 False
+        """
+        try:
+            redis = await self._get_redis()
+            cache_key = self._get_cache_key(key)
+            
+            pipe = redis.pipeline(transaction=False)
+            pipe.expire(cache_key, expire)
+            pipe.zadd(self.index_key, {cache_key: time.time() + expire}, xx=True)
+            refreshed, _ = await pipe.execute()
+            return bool(refreshed)
+            
+        except Exception as e:
+            logger.error(f"刷新缓存过期时间失败 {key}: {str(e)}")
+            return False
+    
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Optional[Any]]:
+        """
+        批量获取缓存数据，使用 MGET 一次往返完成
+        
+        Args:
+            keys: 缓存键列表
+            
+        Returns:
+            键到缓存数据的映射，未命中的键对应 None
+        """
+        results: Dict[str, Optional[Any]] = {}
+        missing = []
+        for key in keys:
+            data = self._memory_cache.get(key)
+            results[key] = data
+            if data is None:
+                missing.append(key)
+        
+        if not missing:
+            return results
+        
+        try:
+            redis = await self._get_redis()
+            values = await redis.mget([self._get_cache_key(key) for key in missing])
+            
+            for key, value in zip(missing, values):
+                if value is None:
+                    continue
+                try:
+                    data = _unpack(value)
+                except (msgpack.UnpackException, ValueError) as e:
+                    logger.warning(f"缓存数据格式错误 {key}: {str(e)}")
+                    continue
+                self._memory_cache.set(key, data)
+                results[key] = data
+            
+            logger.debug(f"批量获取缓存: {len(results)} 个键, Redis 查询 {len(missing)} 个")
+            
+        except Exception as e:
+            logger.error(f"批量读取缓存失败: {str(e)}")
+        
+        return results
+    
+    async def set_many(self, items: Dict[str, Any], expire: Optional[int] = None) -> bool:
+        """
+        批量设置缓存数据，使用 pipeline 一次往返完成
+        
+        Args:
+            items: 键到数据的映射
+            expire: 过期时间（秒），None 表示永不过期
+            
+        Returns:
+            设置成功返回 True，失败返回 False
+        """
+        if not items:
+            return True
+        
+        try:
+            redis = await self._get_redis()
+            now = time.time()
+            score = now + expire if expire else float('inf')
+            
+            pipe = redis.pipeline(transaction=False)
+            index_members = {}
+            for key, data in items.items():
+                cache_key = self._get_cache_key(key)
+                serialized_data = compress(_packer.pack(data))
+                pipe.set(cache_key, serialized_data, ex=expire or None)
+                index_members[cache_key] = score
+            pipe.zadd(self.index_key, index_members)
+            pipe.zremrangebyscore(self.index_key, '-inf', now)
+            await pipe.execute()
+            
+            for key, data in items.items():
+                self._memory_cache.set(key, data, expire)
+            
+            logger.debug(f"批量设置缓存: {len(items)} 个键")
+            return True
+            
+        except Exception as e:
+            logger.error(f"批量设置缓存失败: {str(e)}")
+            return False
+    
     async def delete(self, key: str) -> bool:
         """
         删除缓存数据
@@ -146,10 +344,14 @@ class RedisCacheManager:
             删除成功返回 True，失败返回 False
         """
         try:
+            self._memory_cache.delete(key)
             redis = await self._get_redis()
             cache_key = self._get_cache_key(key)
             
-            deleted_count = await redis.delete(cache_key)
+            pipe = redis.pipeline(transaction=False)
+            pipe.delete(cache_key)
+            pipe.zrem(self.index_key, cache_key)
+            deleted_count, _ = await pipe.execute()
             success = deleted_count > 0
             
             if success:
@@ -163,6 +365,71 @@ class RedisCacheManager:
             logger.error(f"删除缓存失败 {key}: {str(e)}")
             return False
     
+    async def invalidate(self, keys: Iterable[str]) -> bool:
+        """
+        删除一组缓存，并通过 Redis pub/sub 通知所有进程清除一级缓存中的对应条目
+        
+        Args:
+            keys: 缓存键
+            
+        Returns:
+            操作成功返回 True，失败返回 False
+        """
+        keys = list(keys)
+        if not keys:
+            return True
+        try:
+            for key in keys:
+                self._memory_cache.delete(key)
+            redis = await self._get_redis()
+            cache_keys = [self._get_cache_key(key) for key in keys]
+            
+            pipe = redis.pipeline(transaction=False)
+            pipe.delete(*cache_keys)
+            pipe.zrem(self.index_key, *cache_keys)
+            pipe.publish(self.invalidation_channel, _packer.pack(keys))
+            await pipe.execute()
+            logger.debug(f"缓存失效: {len(keys)} 个键")
+            return True
+            
+        except Exception as e:
+            logger.error(f"缓存失效失败: {str(e)}")
+            return False
+    
+    def subscribe_invalidations(self, callback: Optional[Callable[[List[str]], None]] = None):
+        """
+        订阅失效通知（需在事件循环中调用）
+        
+        收到通知时清除本进程一级缓存中的对应条目，并调用 callback(keys)，
+        供上层清除自己的进程内缓存
+        """
+        if callback is not None:
+            self._invalidation_callbacks.append(callback)
+        if self._invalidation_task is None:
+            self._invalidation_task = asyncio.create_task(self._listen_invalidations())
+    
+    async def _listen_invalidations(self):
+        """接收失效通知，连接断开时稍后重新订阅"""
+        while True:
+            try:
+                redis = await self._get_redis()
+                pubsub = redis.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(self.invalidation_channel)
+                try:
+                    async for message in pubsub.listen():
+                        keys = msgpack.unpackb(message["data"], raw=False)
+                        for key in keys:
+                            self._memory_cache.delete(key)
+                        for callback in self._invalidation_callbacks:
+                            callback(keys)
+                finally:
+                    await pubsub.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"失效通知订阅中断: {str(e)}")
+                await asyncio.sleep(5)
+    
     async def clear_expired(self) -> int:
         """
         清理过期的缓存
@@ -176,45 +443,62 @@ class RedisCacheManager:
         logger.info("Redis 自动处理过期键，无需手动清理")
         return 0
     
-    async def get_cache_stats(self) -> dict:
+    async def get_cache_stats(self, full_scan: bool = False) -> dict:
         """
         获取缓存统计信息
         
+        Args:
+            full_scan: 是否使用 SCAN 遍历全部键进行精确统计。
+                默认从键索引读取条目数（O(1)），索引可能因 Redis 内存淘汰而略有偏差
+        
         Returns:
             包含缓存统计信息的字典
         """
         try:
             redis = await self._get_redis()
             
-            # 获取所有匹配前缀的键
-            pattern = f"{self.key_prefix}*"
-            keys = await redis.keys(pattern)
+            if full_scan:
+                # 使用 SCAN 增量遍历匹配前缀的键，避免 KEYS 阻塞 Redis
+                pattern = f"{self.key_prefix}*"
+                total_keys = 0
+                sample_keys = []
+                async for key in redis.scan_iter(match=pattern, count=1000):
+                    if key == self.index_key.encode():
+                        continue
+                    total_keys += 1
+                    if len(sample_keys) < 100:  # 限制检查数量，避免性能问题
+                        sample_keys.append(key)
+            else:
+                # 先移除索引中已过期的成员，再读取条目数
+                pipe = redis.pipeline(transaction=False)
+                pipe.zremrangebyscore(self.index_key, '-inf', time.time())
+                pipe.zcard(self.index_key)
+                pipe.zrange(self.index_key, 0, 99)
+                _, total_keys, sample_keys = await pipe.execute()
             
             stats = {
-                'total_keys': len(keys),
+                'total_keys': total_keys,
                 'total_memory': 0,
                 'expired_keys': 0,  # Redis 自动清理，无法统计
-                'valid_keys': len(keys),
+                'valid_keys': total_keys,
                 'redis_info': {}
             }
             
             # 获取内存使用情况
-            if keys:
-                # 计算所有键的内存使用 (近似值)
+            if sample_keys:
+                # 计算采样键的内存使用 (近似值)，通过 pipeline 一次往返完成
                 memory_usage = 0
-                for key in keys[:100]:  # 限制检查数量，避免性能问题
-                    try:
-                        size = await redis.memory_usage(key)
-                        if size:
-                            memory_usage += size
-                    except:
-                        pass  # 某些 Redis 版本可能不支持 MEMORY USAGE
+                try:
+                    pipe = redis.pipeline(transaction=False)
+                    for key in sample_keys:
+                        pipe.memory_usage(key)
+                    sizes = await pipe.execute(raise_on_error=False)
+                    memory_usage = sum(size for size in sizes if isinstance(size, int))
+                except Exception:
+                    pass  # 某些 Redis 版本可能不支持 MEMORY USAGE
                 
                 # 估算总内存使用
-                if len(keys) > 100:
-                    stats['total_memory'] = int(memory_usage * len(keys) / 100)
-                else:
-                    stats['total_memory'] = memory_usage
+                stats['total_memory'] = int(memory_usage * total_keys / len(sample_keys))
             
             # 获取 Redis 服务器信息
             try:
@@ -246,6 +530,13 @@ class RedisCacheManager:
         关闭 Redis 连接
         在应用关闭时调用
         """
+        if self._invalidation_task is not None:
+            self._invalidation_task.cancel()
+            try:
+                await self._invalidation_task
+            except asyncio.CancelledError:
+                pass
+            self._invalidation_task = None
         if self.redis:
             try:
                 await self.redis.close()
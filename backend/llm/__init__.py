@@ -1,4 +1,4 @@
 """
 LLM相关模块
-包含LLM客户端和提示词模板
+包含LLM客户端、提示词模板和语义缓存
 """
\ No newline at end of file
@@ -1,18 +1,54 @@
 import asyncio
-import json
+import functools
+import hashlib
+import logging
+import math
 import os
+import time
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
+from operator import itemgetter
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_core.caches import InMemoryCache
+from langchain_core.globals import set_llm_cache
 from langchain_community.callbacks.manager import get_openai_callback
 from langgraph.graph import StateGraph, END
 from typing_extensions import TypedDict
+import orjson
+
+try:
+    import tiktoken
+except ImportError:  # 未安装时按字符数估算token数
+    tiktoken = None
+
+try:
+    from semantic_text_splitter import TextSplitter as FastTextSplitter
+except ImportError:  # 可选依赖，未安装时使用 LangChain 的分割器
+    FastTextSplitter = None
 
 from utils.logger import get_logger
-from .prompts import LANGGRAPH_MAP_PROMPT, LANGGRAPH_REDUCE_PROMPT
+from caching.memory_cache import MemoryCache
+from .prompts import (
+    LANGGRAPH_MAP_SYSTEM_PROMPT, LANGGRAPH_MAP_HUMAN_PROMPT,
+    LANGGRAPH_REDUCE_SYSTEM_PROMPT, LANGGRAPH_REDUCE_HUMAN_PROMPT
+)
+from .semantic_cache import SemanticCache
+
+# Map/Reduce 的单次LLM调用按提示词精确匹配缓存，重复的文档块无需再次请求；
+# LangChain 的LLM缓存是进程级全局设置，只在模块加载时设置一次
+LLM_CACHE_SIZE = 1024
+set_llm_cache(InMemoryCache(maxsize=LLM_CACHE_SIZE))
+
+@functools.lru_cache(maxsize=8)
+def _get_encoding(model_name: str):
+    """获取模型对应的分词器（加载编码表开销较大，只加载一次）"""
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
 
 class GraphState(TypedDict):
     """LangGraph状态定义"""
@@ -34,6 +70,17 @@ class ProcessingConfig:
     request_timeout: int = 60
     min_chunk_length: int = 30  # 最小文档块长度
     total_trajectories_target: int = 40  # 总轨迹数目标
+    # 语义缓存默认关闭：相似度阈值无法区分措辞相近的不同人物，命中可能返回他人的轨迹，且每次未命中多一次嵌入调用
+    semantic_cache_enabled: bool = False  # 是否启用语义缓存
+    semantic_cache_threshold: float = 0.92  # 语义缓存命中的相似度阈值
+    semantic_cache_size: int = 256  # 语义缓存最大条目数
+    semantic_cache_ttl: int = 3600  # 语义缓存条目存活时间（秒）
+    embedding_model: str = "text-embedding-3-small"  # 语义缓存使用的嵌入模型
+    map_cache_size: int = 10000  # Map结果缓存的最大条目数
+    map_cache_ttl: int = 86400  # Map结果缓存的存活时间（秒）
+    map_length_bins: int = 3  # Map阶段按文档块长度分组的组数
+    max_concurrent_map_calls: int = 8  # Map阶段同时进行的LLM调用数上限
+    single_shot_token_budget: int = 6000  # 全文token数低于该值时不分割，单次调用处理全文
 
 class LangChainProcessor:
     """
@@ -78,8 +125,33 @@ class LangChainProcessor:
             request_timeout=self.config.request_timeout,
             max_retries=self.config.max_retries
         )
+        # JSON 模式：模型保证输出合法的 JSON 对象，用于直接产出最终结果的 Reduce 和单次调用
+        self.json_llm = self.llm.bind(response_format={"type": "json_object"})
+        
+        # Map结果缓存：相同模型、轨迹数限制和文档块内容的调用直接复用结果
+        self._map_cache = MemoryCache(maxsize=self.config.map_cache_size, ttl=self.config.map_cache_ttl)
+        # 每个缓存键对应一把锁，并发的相同请求只发起一次LLM调用；
+        # 同时记录持有或等待该锁的协程数，最后一个离开时才删除锁
+        self._map_locks: Dict[str, asyncio.Lock] = {}
+        self._map_lock_users: Dict[str, int] = {}
+        # 限制同时进行的Map调用数，避免长文本分块过多时大量并发请求触发限流和重试
+        self._map_semaphore = asyncio.Semaphore(self.config.max_concurrent_map_calls or 8)
+        
+        # 语义缓存：与之前输入足够相似的生平文本直接返回已有结果
+        self.semantic_cache = None
+        if self.config.semantic_cache_enabled:
+            self.semantic_cache = SemanticCache(
+                OpenAIEmbeddings(openai_api_key=api_key, model=self.config.embedding_model),
+                threshold=self.config.semantic_cache_threshold,
+                maxsize=self.config.semantic_cache_size,
+                ttl=self.config.semantic_cache_ttl
+            )
         
         # 初始化文档分割器
+        # 优先使用 Rust 实现的 semantic-text-splitter，单次扫描按语义层级分割，速度远快于逐个分隔符递归的纯 Python 实现
+        self.fast_text_splitter = None
+        if FastTextSplitter is not None:
+            self.fast_text_splitter = FastTextSplitter(self.config.chunk_size, overlap=self.config.chunk_overlap)
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=self.config.chunk_size,
             chunk_overlap=self.config.chunk_overlap,
@@ -101,19 +173,28 @@ class LangChainProcessor:
         2. Reduce阶段：合并所有处理结果
         """
         # 使用prompts.py中的模板
-        self.map_prompt = PromptTemplate(
-            template=LANGGRAPH_MAP_PROMPT,
-            input_variables=["text", "max_trajectories"]
-        )
-        
-        self.reduce_prompt = PromptTemplate(
-            template=LANGGRAPH_REDUCE_PROMPT,
-            input_variables=["text"]
-        )
+        # 固定指令作为 system 消息原样发送，所有调用共享相同的前缀，可命中 OpenAI 的自动提示词前缀缓存；
+        # system 消息只构建一次，每次调用只格式化很短的 human 消息
+        self._map_system_message = SystemMessage(content=LANGGRAPH_MAP_SYSTEM_PROMPT)
+        self._reduce_system_message = SystemMessage(content=LANGGRAPH_REDUCE_SYSTEM_PROMPT)
         
         # 创建LangGraph工作流
         self._create_graph()
     
+    def _build_map_messages(self, text: str, max_trajectories: int) -> List[Any]:
+        """构建Map阶段的消息列表"""
+        return [
+            self._map_system_message,
+            HumanMessage(content=LANGGRAPH_MAP_HUMAN_PROMPT.format(text=text, max_trajectories=max_trajectories))
+        ]
+    
+    def _build_reduce_messages(self, text: str) -> List[Any]:
+        """构建Reduce阶段的消息列表"""
+        return [
+            self._reduce_system_message,
+            HumanMessage(content=LANGGRAPH_REDUCE_HUMAN_PROMPT.format(text=text))
+        ]
+    
     async def process_biography(self, biography_text: str) -> Dict[str, Any]:
         """
         处理人物生平文本，提取轨迹数据和坐标信息
@@ -133,20 +214,50 @@ class LangChainProcessor:
         
         self.logger.info(f"开始处理生平文本，长度: {len(biography_text)}字符")
         
+        # 0. 查询语义缓存，嵌入计算失败时不影响正常处理
+        cache_vector = None
+        if self.semantic_cache is not None:
+            try:
+                cached_result, cache_vector = await self.semantic_cache.aget(biography_text)
+                if cached_result is not None:
+                    self.logger.info("语义缓存命中，跳过LLM处理")
+                    return cached_result
+            except Exception as e:
+                self.logger.warning(f"语义缓存查询失败: {str(e)}")
+        
         try:
+            # 全文足够短时无需分割，直接单次调用
+            if self._count_tokens(biography_text) < self.config.single_shot_token_budget:
+                result = await self._process_single_shot(biography_text)
+                return self._finish_result(result, cache_vector)
+            
             # 1. 智能文档分割
             documents = await self._split_documents(biography_text)
             # 2. 并发处理文档块
             result = await self._process_documents(documents)
             # 3. 验证和清理结果
-            validated_result = self._validate_result(result)
-            self.logger.info(f"处理完成，生成轨迹点: {len(validated_result.get('life_trajectory', {}).get('trajectory', []))}个")
-            return validated_result
+            return self._finish_result(result, cache_vector)
             
         except Exception as e:
             self.logger.error(f"处理生平文本失败: {str(e)}")
             raise
     
+    def _finish_result(self, result: Dict[str, Any], cache_vector: Optional[List[float]]) -> Dict[str, Any]:
+        """验证结果并写入语义缓存"""
+        validated_result = self._validate_result(result)
+        trajectory_count = len(validated_result.get('life_trajectory', {}).get('trajectory', []))
+        self.logger.info(f"处理完成，生成轨迹点: {trajectory_count}个")
+        # 只缓存有效结果，空结果可能是临时失败导致的
+        if cache_vector is not None and trajectory_count:
+            self.semantic_cache.update(cache_vector, validated_result)
+        return validated_result
+    
+    def _count_tokens(self, text: str) -> int:
+        """计算文本的token数，未安装tiktoken时按字符数估算（中文约每字一个token）"""
+        if tiktoken is None:
+            return len(text)
+        return len(_get_encoding(self.llm.model_name).encode(text))
+    
     async def _split_documents(self, text: str) -> List[Document]:
         """
         智能分割文档
@@ -157,30 +268,33 @@ class LangChainProcessor:
         Returns:
             分割后的文档列表
         """
-        # 使用LangChain的智能分割器
-        documents = self.text_splitter.create_documents([text])
-        
-        # 输出每个chunk的详细信息
-        self.logger.info(f"文档分割结果: 共生成 {len(documents)} 个chunks")
-        for i, doc in enumerate(documents):
-            content_preview = doc.page_content
-            self.logger.info(f"Chunk {i+1}: 长度={len(doc.page_content)}, 内容预览='{content_preview}'")
-        
-        # 过滤过短的文档块
-        filtered_docs = [
-            doc for doc in documents 
-            if len(doc.page_content.strip()) >= self.config.min_chunk_length
-        ]
-        
-        self.logger.info(f"文档分割完成: {len(documents)} -> {len(filtered_docs)}块（过滤后）")
+        # 使用智能分割器
+        if self.fast_text_splitter is not None:
+            documents = [Document(page_content=chunk) for chunk in self.fast_text_splitter.chunks(text)]
+        else:
+            documents = self.text_splitter.create_documents([text])
+        
+        # 汇总输出chunk信息，逐块预览仅在调试级别输出
+        self.logger.info(f"文档分割结果: 共生成 {len(documents)} 个chunks, 长度={[len(doc.page_content) for doc in documents]}")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            for i, doc in enumerate(documents):
+                self.logger.debug(f"Chunk {i+1}: 长度={len(doc.page_content)}, 内容预览='{doc.page_content[:80]}'")
+        
+        # 过滤过短的文档块，并去除内容完全相同的文档块（只保留首次出现的）
+        # 重复块的提取结果与首次出现的块相同，Reduce阶段本身也会去重，因此无需展开回原位置
+        seen = set()
+        filtered_docs = []
+        for doc in documents:
+            content = doc.page_content.strip()
+            if len(content) < self.config.min_chunk_length:
+                continue
+            digest = hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            filtered_docs.append(doc)
         
-        # 为每个文档添加元数据
-        for i, doc in enumerate(filtered_docs):
-            doc.metadata.update({
-                "chunk_id": i,
-                "chunk_length": len(doc.page_content),
-                "max_trajectories": self._calculate_max_trajectories(len(filtered_docs))
-            })
+        self.logger.info(f"文档分割完成: {len(documents)} -> {len(filtered_docs)}块（过滤和去重后）")
         
         return filtered_docs
     
@@ -236,13 +350,33 @@ class LangChainProcessor:
         self.logger.info(f"Map阶段：处理 {len(documents)} 个文档块")
         
         try:
-            # 并发处理所有文档
-            tasks = []
-            for doc in documents:
-                task = self._process_single_document(doc, max_trajectories)
-                tasks.append(task)
+            # 按文档块长度分组（短/中/长），每组使用与长度相称的 max_tokens，
+            # 各组并发执行，短块的结果不必等待长块
+            order = sorted(range(len(documents)), key=lambda i: len(documents[i].page_content))
+            bin_size = math.ceil(len(order) / max(1, self.config.map_length_bins))
+            bins = [order[i:i + bin_size] for i in range(0, len(order), bin_size)]
+            
+            async def process_bin(bin_index: int, indices: List[int]) -> List[Any]:
+                max_tokens = max(1, self.config.max_tokens_per_chunk * (bin_index + 1) // len(bins))
+                llm = self.llm.bind(max_tokens=max_tokens)
+                start_time = time.perf_counter()
+                results = await asyncio.gather(
+                    *(self._process_single_document(documents[i], max_trajectories, llm) for i in indices),
+                    return_exceptions=True
+                )
+                self.logger.info(
+                    f"Map分组{bin_index + 1}/{len(bins)}: {len(indices)}块, "
+                    f"max_tokens={max_tokens}, 耗时: {time.perf_counter() - start_time:.2f}秒"
+                )
+                return results
+            
+            bin_results = await asyncio.gather(*(process_bin(i, indices) for i, indices in enumerate(bins)))
             
-            map_results = await asyncio.gather(*tasks, return_exceptions=True)
+            # 恢复原始文档顺序
+            map_results = [None] * len(documents)
+            for indices, results in zip(bins, bin_results):
+                for i, result in zip(indices, results):
+                    map_results[i] = result
             
             # 过滤异常结果
             valid_results = []
@@ -265,9 +399,9 @@ class LangChainProcessor:
         map_results = state["map_results"]
         
         if not map_results:
-            empty_result = json.dumps({
+            empty_result = orjson.dumps({
                 "life_trajectory": {"person_name": "", "trajectory": []}
-            })
+            }).decode('utf-8')
             return {**state, "final_result": empty_result, "error": None}
         
         self.logger.info(f"Reduce阶段：合并 {len(map_results)} 个结果")
@@ -277,16 +411,14 @@ class LangChainProcessor:
             combined_text = "\n\n".join(map_results)
             
             # 使用LLM进行最终合并
-            reduce_input = self.reduce_prompt.format(text=combined_text)
+            reduce_input = self._build_reduce_messages(combined_text)
             
             with get_openai_callback() as cb:
-                final_result = await asyncio.to_thread(
-                    self.llm.invoke,
-                    reduce_input
-                )
+                final_result = await self.json_llm.ainvoke(reduce_input)
                 
                 self.logger.info(
                     f"Reduce阶段完成 - Token使用: {cb.total_tokens}, "
+                    f"缓存命中Token: {getattr(cb, 'prompt_tokens_cached', 0)}, "
                     f"成本: ${cb.total_cost:.4f}, 请求次数: {cb.successful_requests}"
                 )
             
@@ -301,26 +433,70 @@ class LangChainProcessor:
             self.logger.error(f"Reduce阶段失败: {str(e)}")
             return {**state, "final_result": "", "error": str(e)}
     
-    async def _process_single_document(self, doc: Document, max_trajectories: int) -> str:
+    async def _process_single_document(self, doc: Document, max_trajectories: int, llm=None) -> str:
         """
         处理单个文档块
         
         Args:
             doc: 文档对象
             max_trajectories: 最大轨迹数
+            llm: 使用的模型（可绑定不同的 max_tokens），默认为 self.llm
             
         Returns:
             处理结果字符串
         """
-        # 格式化prompt
-        map_input = self.map_prompt.format(
-            text=doc.page_content,
-            max_trajectories=max_trajectories
-        )
-        # 调用LLM
-        result = await asyncio.to_thread(self.llm.invoke, map_input)
-        # 提取文本内容
-        return result.content if hasattr(result, 'content') else str(result)
+        cache_key = hashlib.sha256(
+            f"{self.llm.model_name}|{max_trajectories}|{doc.page_content}".encode('utf-8')
+        ).hexdigest()
+        cached = self._map_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        lock = self._map_locks.setdefault(cache_key, asyncio.Lock())
+        self._map_lock_users[cache_key] = self._map_lock_users.get(cache_key, 0) + 1
+        try:
+            async with lock:
+                # 等待锁期间其他协程可能已完成相同的调用
+                cached = self._map_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+                
+                # 格式化prompt
+                map_input = self._build_map_messages(doc.page_content, max_trajectories)
+                # 调用LLM
+                # 使用原生异步接口，不占用线程池线程
+                async with self._map_semaphore:
+                    result = await (llm or self.llm).ainvoke(map_input)
+                # 提取文本内容
+                content = result.content if hasattr(result, 'content') else str(result)
+                self._map_cache.set(cache_key, content)
+                return content
+        finally:
+            # 锁释放后等待方尚未被唤醒时 lock.locked() 已为 False，需按使用者计数判断
+            self._map_lock_users[cache_key] -= 1
+            if not self._map_lock_users[cache_key]:
+                del self._map_lock_users[cache_key]
+                del self._map_locks[cache_key]
+    
+    async def _process_single_shot(self, text: str) -> Dict[str, Any]:
+        """
+        单次LLM调用处理全文，省去Map的多次调用和Reduce的合并调用
+        
+        Args:
+            text: 完整的生平文本
+            
+        Returns:
+            处理结果
+        """
+        self.logger.info("文本较短，跳过MapReduce，单次调用处理全文")
+        
+        start_time = time.perf_counter()
+        map_input = self._build_map_messages(text, self.config.total_trajectories_target)
+        result = await self.json_llm.ainvoke(map_input)
+        result_text = result.content if hasattr(result, 'content') else str(result)
+        self.logger.info(f"单次调用完成，耗时: {time.perf_counter() - start_time:.2f}秒")
+        
+        return self._parse_result(result_text)
     
     async def _process_documents(self, documents: List[Document]) -> Dict[str, Any]:
         """
@@ -342,7 +518,8 @@ class LangChainProcessor:
             "documents": documents,
             "map_results": [],
             "final_result": "",
-            "max_trajectories": documents[0].metadata.get("max_trajectories", self.config.max_trajectories_per_chunk),
+            # 所有文档块共用同一轨迹数限制，只计算一次
+            "max_trajectories": self._calculate_max_trajectories(len(documents)),
             "error": None
         }
         
@@ -375,22 +552,8 @@ class LangChainProcessor:
             解析后的结构化数据
         """
         try:
-            # 清理markdown代码块标记
-            if isinstance(raw_result, str):
-                # 移除可能的markdown代码块标记
-                cleaned_result = raw_result.strip()
-                if cleaned_result.startswith('```json'):
-                    cleaned_result = cleaned_result[7:]  # 移除```json
-                if cleaned_result.startswith('```'):
-                    cleaned_result = cleaned_result[3:]  # 移除```
-                if cleaned_result.endswith('```'):
-                    cleaned_result = cleaned_result[:-3]  # 移除结尾的```
-                cleaned_result = cleaned_result.strip()
-            else:
-                cleaned_result = raw_result
-            
-            # 解析JSON
-            result = json.loads(cleaned_result) if isinstance(cleaned_result, str) else cleaned_result
+            # 结果由 JSON 模式生成，无需清理markdown代码块标记
+            result = orjson.loads(raw_result) if isinstance(raw_result, str) else raw_result
             
             # 标准化结果格式
             if "life_trajectory" not in result and "person_name" in result:
@@ -404,7 +567,7 @@ class LangChainProcessor:
             
             return result
             
-        except (json.JSONDecodeError, TypeError) as e:
+        except (orjson.JSONDecodeError, TypeError) as e:
             self.logger.warning(f"解析LLM结果失败: {str(e)}, 原始结果: {raw_result[:200]}...")
             return {
                 "life_trajectory": {"person_name": "", "trajectory": []}
@@ -448,19 +611,23 @@ class LangChainProcessor:
         Returns:
             去重后的数据列表
         """
-        seen = set()
-        unique_data = []
+        getter = itemgetter(*key_fields)
+        unique = {}
         
         for item in data:
             if not isinstance(item, dict):
                 continue
-                
-            # 创建唯一标识
-            key = tuple(item.get(field, "") for field in key_fields)
             
-            if key not in seen:
-                seen.add(key)
-                unique_data.append(item)
+            # 创建唯一标识（itemgetter 在 C 层取值，缺少字段时回退为空字符串）
+            try:
+                key = getter(item)
+            except KeyError:
+                key = getter({**dict.fromkeys(key_fields, ""), **item})
+            
+            # dict 保持插入顺序，只保留首次出现的条目
+            unique.setdefault(key, item)
+        
+        unique_data = list(unique.values())
         
         # 按指定字段排序（如果提供）
         if sort_key:
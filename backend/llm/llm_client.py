@@ -3,7 +3,33 @@
 """
 import aiohttp
 import asyncio
-from typing import Optional, List, Dict, Any
+import logging
+import random
+import time
+from typing import Optional, List, Dict, Any, Union
+
+import orjson
+
+from utils.logger import get_logger
+
+logger = get_logger("LLMClient")
+
+
+class RetryableLLMError(Exception):
+    """可重试的LLM请求错误（限流、服务端错误、网络错误）"""
+    
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        # 服务端通过 Retry-After 指定的等待时间（秒）
+        self.retry_after = retry_after
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头（仅支持秒数格式）"""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
 
 
 class LLMClient:
@@ -16,7 +42,23 @@ class LLMClient:
     async def _get_session(self):
         """获取HTTP会话"""
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            # 复用 TCP/TLS 连接：放宽单主机连接数上限，缓存 DNS 解析结果，保持空闲连接
+            connector = aiohttp.TCPConnector(
+                limit=200,
+                limit_per_host=100,
+                ttl_dns_cache=300,
+                keepalive_timeout=75,
+                enable_cleanup_closed=True
+            )
+            # 认证头在会话级别设置一次，不必每次请求重新构建
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=60, connect=10),
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                }
+            )
         return self.session
     
     async def close(self):
@@ -41,59 +83,79 @@ class LLMClient:
             "temperature": temperature
         }
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
         url = f"{self.base_url}/chat/completions"
         
         try:
-            async with session.post(url, json=data, headers=headers) as response:
+            async with session.post(url, json=data) as response:
+                if response.status == 429 or response.status >= 500:
+                    error_text = await response.text()
+                    raise RetryableLLMError(
+                        f"GPT请求失败: API错误 {response.status}: {error_text}",
+                        retry_after=_parse_retry_after(response.headers.get("Retry-After"))
+                    )
                 if response.status != 200:
                     error_text = await response.text()
                     raise Exception(f"API错误 {response.status}: {error_text}")
                 
-                result = await response.json()
+                result = orjson.loads(await response.read())
                 return result["choices"][0]["message"]["content"]
+        except RetryableLLMError:
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise RetryableLLMError(f"GPT请求失败: {str(e)}")
         except Exception as e:
             raise Exception(f"GPT请求失败: {str(e)}")
     
-    async def chat_batch(self, requests: List[Dict[str, Any]]) -> List[str]:
+    async def _chat_with_retry(self, req: Dict[str, Any], attempts: int = 3) -> str:
+        """
+        发送单个请求，遇到限流或临时错误时按 Retry-After 或指数退避（带随机抖动）重试
+        
+        Args:
+            req: 请求参数，格式同 chat_batch
+            attempts: 最大尝试次数
+        """
+        for attempt in range(attempts):
+            try:
+                return await self.chat(
+                    message=req["message"],
+                    system_prompt=req.get("system_prompt"),
+                    max_tokens=req.get("max_tokens", 10000),
+                    temperature=req.get("temperature", 0.0)
+                )
+            except RetryableLLMError as e:
+                if attempt == attempts - 1:
+                    raise
+                # 服务端给出的 Retry-After 同样以30秒封顶，避免单个请求被挂起过久
+                delay = min(e.retry_after, 30) if e.retry_after is not None else min(30, 2 ** attempt) + random.uniform(0, 1)
+                await asyncio.sleep(delay)
+    
+    async def chat_batch(self, requests: List[Dict[str, Any]]) -> List[Union[str, Exception]]:
         """
         批量并发处理多个LLM请求
         
+        单个请求失败不影响其他请求，限流和临时错误会单独重试
+        
         Args:
             requests: 请求列表，每个请求包含 {"message": str, "system_prompt": str, "max_tokens": int, "temperature": float}
             
         Returns:
-            响应列表，与请求顺序对应
+            响应列表，与请求顺序对应；失败的请求对应位置为异常对象，由调用方决定如何处理
         """
-        import time
-        from utils.logger import get_logger
-        
-        logger = get_logger("LLMClient")
+        log_info = logger.isEnabledFor(logging.INFO)
         
         async def timed_chat(req_index: int, req: Dict[str, Any]):
             """带时间记录的chat请求"""
-            start_time = time.time()
+            start_time = time.perf_counter()
             try:
-                result = await self.chat(
-                    message=req["message"],
-                    system_prompt=req.get("system_prompt"),
-                    max_tokens=req.get("max_tokens", 10000),
-                    temperature=req.get("temperature", 0.0)
-                )
-                end_time = time.time()
-                duration = end_time - start_time
-                logger.info(f"Chat请求#{req_index+1} 耗时: {duration:.2f}秒")
+                result = await self._chat_with_retry(req)
+                if log_info:
+                    logger.info(f"Chat请求#{req_index+1} 耗时: {time.perf_counter() - start_time:.2f}秒")
                 # logger.info(f"Chat请求#{req_index+1} 输入: {req['message']}")
                 # logger.info(f"Chat请求#{req_index+1} 输出: {result}")
 
                 return result
             except Exception as e:
-                end_time = time.time()
-                duration = end_time - start_time
+                duration = time.perf_counter() - start_time
                 logger.error(f"Chat请求#{req_index+1} 失败，耗时: {duration:.2f}秒，错误: {str(e)}")
                 raise e
         
@@ -102,25 +164,13 @@ class LLMClient:
             task = timed_chat(i, req)
             tasks.append(task)
         
-        # 并发执行所有请求
-        batch_start_time = time.time()
-        try:
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            batch_end_time = time.time()
-            batch_duration = batch_end_time - batch_start_time
-            logger.info(f"批量请求总耗时: {batch_duration:.2f}秒，请求数: {len(requests)}")
-
-            # 处理异常结果
-            processed_results = []
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    raise Exception(f"批量请求第{i+1}个失败: {str(result)}")
-                processed_results.append(result)
-            
-            return processed_results
-        except Exception as e:
-            batch_end_time = time.time()
-            batch_duration = batch_end_time - batch_start_time
-            logger.error(f"批量LLM请求失败，总耗时: {batch_duration:.2f}秒，错误: {str(e)}")
-            raise Exception(f"批量LLM请求失败: {str(e)}")
-
+        # 并发执行所有请求，保留成功的结果
+        batch_start_time = time.perf_counter()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        
+        if log_info:
+            batch_duration = time.perf_counter() - batch_start_time
+            failed_count = sum(1 for result in results if isinstance(result, Exception))
+            logger.info(f"批量请求总耗时: {batch_duration:.2f}秒，请求数: {len(requests)}，失败数: {failed_count}")
+        
+        return results
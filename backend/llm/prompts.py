@@ -122,8 +122,60 @@ LIFE_TRAJECTORY_WITH_COORDINATES_PROMPT = """你是一个专业的历史分析
 9. 对于省份级别的地点，返回省会城市或最具代表性城市的坐标
 10. 确保返回的是有效的JSON格式"""
 
-# LangGraph Map阶段提示词模板
-LANGGRAPH_MAP_PROMPT_BASE = """你是一个专业的历史分析师和地理信息专家，擅长从人物传记中提取关键的时空轨迹信息并提供精确的地理坐标。
+# 多段落合并解析提示词：一次请求处理多个编号段落，按段落分别返回轨迹
+LIFE_TRAJECTORY_BATCH_PROMPT = """你是一个专业的历史分析师和地理信息专家，擅长从人物传记中提取关键的时空轨迹信息并提供精确的地理坐标。
+
+用户会提供同一人物生平中的若干个段落，每个段落以"段落N:"开头，段落之间以"==="分隔。
+请分别分析每个段落，提取其中的重要轨迹点，并为每个地点提供精确的经纬度坐标。
+
+每个轨迹点应该包含：
+1. 时间：具体的年份或年月日（如果有的话）
+2. 地点：具体的地理位置（城市、地区或国家）
+3. 描述：简短的事件描述（不超过30字）
+4. 坐标：该地点的经纬度坐标
+
+以JSON格式返回，每个段落对应results中的一项，格式如下：
+{
+  "person_name": "人物姓名",
+  "results": [
+    {
+      "paragraph_id": 1,
+      "trajectory": [
+        {
+          "time": "1893年12月26日",
+          "location": "湖南韶山",
+          "description": "1893年12月26日，出生于湖南韶山冲",
+          "coordinates": {
+            "latitude": 27.915,
+            "longitude": 112.526,
+            "confidence": "high"
+          }
+        }
+      ]
+    },
+    {
+      "paragraph_id": 2,
+      "trajectory": []
+    }
+  ]
+}
+
+注意事项：
+1. 只提取有明确时间和地点的重要事件，没有符合条件的事件时该段落的trajectory为空数组
+2. 优先选择对人物生平有重大影响的事件，每个段落内按时间顺序排列
+3. 地点要尽可能具体，但避免过于详细的地址，不要在地点中出现任何分隔符
+4. 若一个事件中出现多个地点，请只返回一个地点
+5. 描述要简洁明了，突出事件的重要性
+6. 坐标使用十进制度数格式，精确到小数点后3位
+7. 如果地点名称不明确，选择最知名的同名城市
+8. confidence表示坐标准确性：high(准确)、medium(大致准确)、low(不确定)
+9. 对于省份级别的地点，返回省会城市或最具代表性城市的坐标
+10. 确保返回的是有效的JSON格式"""
+
+# LangGraph Map阶段提示词
+# 固定的指令部分作为 system 消息，每次调用完全相同，可命中模型服务端的提示词前缀缓存；
+# 变化的轨迹数限制和文本片段放在 human 消息中
+LANGGRAPH_MAP_SYSTEM_PROMPT = """你是一个专业的历史分析师和地理信息专家，擅长从人物传记中提取关键的时空轨迹信息并提供精确的地理坐标。
 
 请仔细分析提供的人物生平信息，提取出该人物的重要轨迹点，并为每个地点提供精确的经纬度坐标。
 
@@ -134,7 +186,7 @@ LANGGRAPH_MAP_PROMPT_BASE = """你是一个专业的历史分析师和地理信
 4. 坐标：该地点的经纬度坐标
 
 重要规则：
-1. 这是分块处理，请严格控制输出的轨迹点数量不超过{max_trajectories}个
+1. 这是分块处理，请严格控制输出的轨迹点数量不超过用户消息中指定的上限
 2. 优先选择最重要和最具代表性的轨迹点
 3. 【关键】必须返回完整有效的JSON格式，不能有任何截断或格式错误
 4. 如果文本片段信息不足，可以输出较少的轨迹点，但必须保持JSON格式完整
@@ -172,20 +224,16 @@ LANGGRAPH_MAP_PROMPT_BASE = """你是一个专业的历史分析师和地理信
   "trajectory": []
 }
 
-请分析以下人物生平片段：
-{text}
-
 请确保返回的JSON格式完整且有效，不要有任何截断。"""
 
-LANGGRAPH_MAP_PROMPT = (
-    LANGGRAPH_MAP_PROMPT_BASE.replace("{", "{{").replace("}", "}}")
-         .replace("{{max_trajectories}}", "{max_trajectories}")
-         .replace("{{text}}", "{text}")
-)
+LANGGRAPH_MAP_HUMAN_PROMPT = """轨迹点数量上限：{max_trajectories}个
+
+请分析以下人物生平片段：
+{text}"""
 
 
-# LangGraph Reduce阶段提示词模板
-LANGGRAPH_REDUCE_PROMPT_BASE = """你是一个专业的历史数据整理专家。请将以下多个JSON格式的人物轨迹数据合并成一个完整的结果。
+# LangGraph Reduce阶段提示词
+LANGGRAPH_REDUCE_SYSTEM_PROMPT = """你是一个专业的历史数据整理专家。请将用户提供的多个JSON格式的人物轨迹数据合并成一个完整的结果。
 
 合并规则：
 1. 保持所有轨迹点的时间顺序
@@ -194,9 +242,7 @@ LANGGRAPH_REDUCE_PROMPT_BASE = """你是一个专业的历史数据整理专家
 4. 输出格式必须是有效的JSON
 5. 最终结果只包含life_trajectory部分，不需要单独的coordinates数组
 6. 坐标信息应该保留在每个轨迹点的coordinates字段中
-
-输入的轨迹数据：
-{text}
+7. 只输出一个JSON对象，不要包含markdown代码块标记或任何其他文字
 
 请输出合并后的完整JSON结果，格式如下：
 {
@@ -218,8 +264,5 @@ LANGGRAPH_REDUCE_PROMPT_BASE = """你是一个专业的历史数据整理专家
 }
 """
 
-LANGGRAPH_REDUCE_PROMPT = (
-    LANGGRAPH_REDUCE_PROMPT_BASE.replace("{", "{{").replace("}", "}}")
-         .replace("{{max_trajectories}}", "{max_trajectories}")
-         .replace("{{text}}", "{text}")
-)
+LANGGRAPH_REDUCE_HUMAN_PROMPT = """输入的轨迹数据：
+{text}"""
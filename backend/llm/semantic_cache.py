@@ -0,0 +1,92 @@
+"""
+语义缓存
+基于文本嵌入的相似度匹配，复述或重复的输入直接返回之前的处理结果
+"""
+import math
+import operator
+import time
+from collections import deque
+from typing import Any, List, Optional, Tuple
+
+import orjson
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class SemanticCache:
+    """
+    内存中的语义缓存
+
+    每个条目保存归一化后的嵌入向量和序列化后的结果，查询时取余弦相似度最高的条目，
+    超过阈值即视为命中。条目数达到上限后淘汰最早写入的条目。
+    """
+
+    def __init__(self, embeddings, threshold: float = 0.92, maxsize: int = 256,
+                 ttl: Optional[float] = 3600, max_chars: int = 4000):
+        """
+        Args:
+            embeddings: LangChain 嵌入模型（需实现 aembed_query）
+            threshold: 余弦相似度阈值，达到该值视为命中
+            maxsize: 最大条目数
+            ttl: 条目存活时间（秒），None 表示不过期
+            max_chars: 计算嵌入时截取的最大字符数，避免超出嵌入模型的输入长度限制
+        """
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_chars = max_chars
+        self._entries: deque = deque(maxlen=maxsize)
+
+    async def embed(self, text: str) -> List[float]:
+        """计算文本的归一化嵌入向量"""
+        vector = await self.embeddings.aembed_query(text[:self.max_chars])
+        norm = math.sqrt(sum(map(operator.mul, vector, vector))) or 1.0
+        return [value / norm for value in vector]
+
+    def lookup(self, vector: List[float]) -> Optional[Any]:
+        """
+        查找与给定向量最相似的缓存结果
+
+        Returns:
+            命中时返回缓存结果的副本，否则返回 None
+        """
+        now = time.time()
+        best_score = 0.0
+        best_payload = None
+        for entry_vector, payload, expire_at in self._entries:
+            if expire_at is not None and now > expire_at:
+                continue
+            score = sum(map(operator.mul, vector, entry_vector))
+            if score > best_score:
+                best_score, best_payload = score, payload
+
+        if best_payload is None or best_score < self.threshold:
+            return None
+
+        logger.debug(f"语义缓存命中，相似度: {best_score:.4f}")
+        # 存储的是序列化后的字节，每次命中返回独立的副本，调用方修改结果不会影响缓存
+        return orjson.loads(best_payload)
+
+    def update(self, vector: List[float], value: Any) -> None:
+        """写入缓存条目"""
+        expire_at = time.time() + self.ttl if self.ttl is not None else None
+        self._entries.append((vector, orjson.dumps(value), expire_at))
+
+    async def aget(self, text: str) -> Tuple[Optional[Any], List[float]]:
+        """
+        按文本查询缓存
+
+        Returns:
+            (缓存结果或 None, 文本的嵌入向量)，未命中时可直接用该向量调用 update
+        """
+        vector = await self.embed(text)
+        return self.lookup(vector), vector
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
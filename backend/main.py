@@ -1,10 +1,13 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 from contextlib import asynccontextmanager
+from functools import lru_cache
+import os
+import secrets
 import uvicorn
 from pathlib import Path
 from services.biography_service import BiographyService
@@ -12,14 +15,26 @@ from models.response_models import (
     BiographyResponse,
 )
 from caching.cache_factory import get_cache_manager
+from utils.http_client import close_session
 from middleware.rate_limiter import RateLimiterMiddleware
-from middleware.validators import validate_person_name_middleware
+from middleware.validators import InputValidator
+
+@lru_cache(maxsize=None)
+def get_biography_service() -> BiographyService:
+    """
+    获取生平服务实例（首次请求时创建，之后复用同一实例）
+    延迟到首次使用时创建，缩短启动时间
+    """
+    return BiographyService()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 启动时的代码可以放在这里
     yield
     # 关闭时的代码
+    if get_biography_service.cache_info().currsize:
+        await get_biography_service().close()
+    await close_session()
     cache_manager = get_cache_manager()
     if hasattr(cache_manager, 'close'):
         await cache_manager.close()
@@ -34,6 +49,7 @@ app = FastAPI(
 # 获取前端文件路径
 current_dir = Path(__file__).parent
 frontend_dir = current_dir.parent / "frontend"
+index_file = frontend_dir / "index.html"
 
 # 挂载静态文件服务
 if frontend_dir.exists():
@@ -54,19 +70,38 @@ app.add_middleware(
 # 添加速率限制中间件
 app.add_middleware(
     RateLimiterMiddleware,
-    requests_per_minute=30  # 每分钟30个请求
+    requests_per_minute=30,  # 每分钟30个请求
+    mode=os.getenv("RATE_LIMIT_MODE", "exact")  # 海量IP场景可设为 bloom
 )
 
-# 添加验证中间件
-app.middleware("http")(validate_person_name_middleware)
-
-# 初始化服务
-biography_service = BiographyService()
-
 class PersonRequest(BaseModel):
     name: str
-    language: Optional[str] = "zh"  # 默认中文
-    detail_level: Optional[str] = "medium"  # basic, medium, detailed
+    # 取值范围与 BiographyService.CACHE_LANGUAGES / CACHE_DETAIL_LEVELS 保持一致，缓存失效时按此枚举缓存键
+    language: Literal["zh", "zh-hans", "en"] = "zh"  # 默认中文
+    detail_level: Literal["basic", "medium", "detailed"] = "medium"
+
+def clean_person_name(name: str) -> str:
+    """校验并清理人物姓名，不合法时返回400"""
+    is_valid, cleaned_name, error_msg = InputValidator.validate_person_name(name)
+    if not is_valid:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "输入验证失败",
+                "message": error_msg,
+                "field": "name"
+            }
+        )
+    return cleaned_name
+
+def validated_person_request(request: PersonRequest) -> PersonRequest:
+    """
+    人物姓名验证依赖
+    
+    在 FastAPI 解析请求体后直接校验并清理姓名，无需在中间件中重复读取和重建请求体
+    """
+    request.name = clean_person_name(request.name)
+    return request
 
 class LocationRequest(BaseModel):
     locations: List[str]
@@ -78,16 +113,14 @@ async def root():
     """
     返回前端主页
     """
-    frontend_dir = Path(__file__).parent.parent / "frontend"
-    index_file = frontend_dir / "index.html"
-    
     if index_file.exists():
         return FileResponse(str(index_file))
     else:
         return {"message": "LifeTracer API is running", "error": "Frontend files not found"}
 
 @app.post("/api/biography", response_model=BiographyResponse)
-async def get_biography(request: PersonRequest):
+async def get_biography(request: PersonRequest = Depends(validated_person_request),
+                         biography_service: BiographyService = Depends(get_biography_service)):
     """
     获取历史人物的生平信息
     """
@@ -106,6 +139,28 @@ async def get_biography(request: PersonRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """
+    管理接口鉴权依赖
+    
+    令牌由环境变量 ADMIN_TOKEN 配置，未配置时管理接口不可用
+    """
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token or not x_admin_token or not secrets.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+@app.delete("/api/admin/biography/{name}", dependencies=[Depends(require_admin_token)])
+async def invalidate_biography(name: str,
+                               biography_service: BiographyService = Depends(get_biography_service)):
+    """
+    使人物的生平缓存失效（如维基百科页面更新后）
+    
+    姓名按与查询接口相同的规则清理，保证得到相同的缓存键
+    """
+    name = clean_person_name(name)
+    await biography_service.invalidate(name)
+    return {"success": True, "name": name}
+
 @app.get("/api/health")
 async def health_check():
     """
@@ -114,10 +169,15 @@ async def health_check():
     return {"status": "healthy", "service": "LifeTracer API"}
 
 if __name__ == "__main__":
+    # loop/http 为 auto 时，已安装 uvloop 和 httptools（uvicorn[standard] 自带）则自动使用，Windows 上回退到 asyncio
+    # 速率限制和内存缓存都是进程内的，默认单进程；热重载仅在开发环境（DEV=1）开启
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
-        log_level="info"
+        loop="auto",
+        http="auto",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        reload=os.getenv("DEV") == "1",
+        log_level=os.getenv("LOG_LEVEL", "warning")
     )
\ No newline at end of file
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Time-limited Bloom Filter for LifeTracer
+时间窗口计数布隆过滤器，用于大规模IP数量下的近似限流
+"""
+
+import hashlib
+import time
+from array import array
+from typing import Tuple
+
+NS_PER_S = 1_000_000_000
+
+
+class TimeLimitedBloomFilter:
+    """
+    时间窗口计数布隆过滤器
+
+    每个键经 k 个哈希函数映射到 m 个计数器，取其中最小值作为该键的请求数估计。
+    计数器按时间窗口分为当前和上一窗口两代，上一窗口的计数按已过去的比例线性衰减，
+    近似滑动窗口。内存固定为 2 * m 个计数器，与IP数量无关；哈希冲突只会高估请求数
+    （可能误限流），不会低估。
+    """
+
+    def __init__(self, size: int = 1 << 20, hashes: int = 4, window_size: int = 60):
+        """
+        Args:
+            size: 每代计数器数量 m
+            hashes: 哈希函数个数 k
+            window_size: 时间窗口（秒）
+        """
+        self.size = size
+        self.hashes = hashes
+        self._window_ns = window_size * NS_PER_S
+        self._current = array('I', bytes(4 * size))
+        self._previous = array('I', bytes(4 * size))
+        self._generation = time.monotonic_ns() // self._window_ns
+
+    def _positions(self, key: str):
+        """双重哈希：由一次 blake2b 摘要派生 k 个计数器位置"""
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def _rotate(self, now: int):
+        """进入新的时间窗口时轮换计数器"""
+        generation = now // self._window_ns
+        if generation == self._generation:
+            return
+        if generation == self._generation + 1:
+            self._previous = self._current
+        else:
+            # 超过一个窗口没有请求，上一窗口的计数也已过期
+            self._previous = array('I', bytes(4 * self.size))
+        self._current = array('I', bytes(4 * self.size))
+        self._generation = generation
+
+    def increment_and_check(self, key: str, limit: int) -> Tuple[bool, int]:
+        """
+        检查键在窗口内的请求数是否已达上限，未达上限时记录本次请求
+
+        Args:
+            key: 计数的键（如客户端IP）
+            limit: 窗口内允许的请求数
+
+        Returns:
+            Tuple[bool, int]: (是否限制, 包含本次请求在内的请求数估计)
+        """
+        now = time.monotonic_ns()
+        self._rotate(now)
+
+        # 上一窗口计数的权重：当前窗口已过去的比例越大，权重越小
+        weight = 1 - (now % self._window_ns) / self._window_ns
+        positions = self._positions(key)
+        current, previous = self._current, self._previous
+        estimate = min(current[p] + int(previous[p] * weight) for p in positions)
+
+        if estimate >= limit:
+            return True, estimate
+
+        for p in positions:
+            current[p] += 1
+        return False, estimate + 1
@@ -5,31 +5,46 @@ Rate Limiter Middleware for LifeTracer
 """
 
 import time
-from typing import Dict, Tuple
-from fastapi import Request, Response
-from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from collections import OrderedDict, deque
+from typing import Deque, List, Tuple
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from utils.logger import get_logger
+from .bloom_filter import NS_PER_S, TimeLimitedBloomFilter
 
 logger = get_logger(__name__)
 
 
-class RateLimiterMiddleware(BaseHTTPMiddleware):
+class RateLimiterMiddleware:
     """
     基于IP的请求频率限制中间件
     
+    纯 ASGI 实现：直接处理 scope/send，不像 BaseHTTPMiddleware 那样为每个请求
+    创建 Request/Response 包装对象并通过内存通道转发响应体
+    
     Features:
     - IP级别限制：每个IP独立计算请求频率
-    - 滑动窗口：使用时间戳记录，自动清理过期记录
+    - 滑动窗口：使用时间戳记录，每次请求时顺带移除该IP的过期记录
     - 响应头：返回限制信息给客户端
-    - 自动清理：定期清理过期的IP记录
+    - 内存上限：IP数超过 max_ips 时按最近最少访问淘汰已无有效请求的IP
+    - 分片存储：IP记录按哈希分到多个分片
+    - 近似模式：mode="bloom" 时改用时间窗口计数布隆过滤器，内存固定，适合海量IP的场景
+    
+    检查与记录在同一个同步方法中完成，中间没有 await，在事件循环中天然是原子的，
+    并发请求不会出现先检查后写入的竞态，因此不需要加锁。
     """
     
+    # IP记录的分片数
+    SHARDS = 32
+    
     def __init__(
         self, 
-        app,
+        app: ASGIApp,
         requests_per_minute: int = 30,
-        cleanup_interval: int = 300  # 5分钟清理一次
+        max_ips: int = 100_000,
+        mode: str = "exact",
+        bloom_size: int = 1 << 20,
+        bloom_hashes: int = 4
     ):
         """
         初始化速率限制器
@@ -37,66 +52,84 @@ class RateLimiterMiddleware(BaseHTTPMiddleware):
         Args:
             app: FastAPI应用实例
             requests_per_minute: 每分钟允许的请求数
-            cleanup_interval: 清理过期记录的间隔（秒）
+            max_ips: 保留的IP记录数软上限，超出后淘汰已无有效请求的IP
+            mode: "exact" 按IP精确计数；"bloom" 使用布隆过滤器近似计数，哈希冲突时可能误限流
+            bloom_size: 布隆过滤器每代计数器数量（仅 bloom 模式）
+            bloom_hashes: 布隆过滤器哈希函数个数（仅 bloom 模式）
         """
-        super().__init__(app)
+        if mode not in ("exact", "bloom"):
+            raise ValueError(f"不支持的限流模式: {mode}")
+        self.app = app
         self.requests_per_minute = requests_per_minute
         self.window_size = 60  # 1分钟窗口
-        self.cleanup_interval = cleanup_interval
-        
-        # 存储每个IP的请求时间戳
-        # 格式: {ip: [timestamp1, timestamp2, ...]}
-        self.ip_requests: Dict[str, list] = {}
-        self.last_cleanup = time.time()
+        self._window_ns = self.window_size * NS_PER_S
+        self.max_ips = max_ips
+        self._max_ips_per_shard = max(1, max_ips // self.SHARDS)
+        
+        # 预先编码固定不变的响应头值；剩余次数只可能是 0..requests_per_minute，也提前编码好
+        self._limit_header = (b"x-ratelimit-limit", str(requests_per_minute).encode())
+        self._window_header = (b"x-ratelimit-window", str(self.window_size).encode())
+        self._remaining_values = [str(i).encode() for i in range(requests_per_minute + 1)]
+        
+        # 存储每个IP的请求时间戳（单调时钟的整数纳秒值，不受系统时间调整影响）
+        # 按 hash(ip) 分片，格式: [OrderedDict{ip: deque([timestamp1, timestamp2, ...])}, ...]，
+        # 队列长度上限为 requests_per_minute；OrderedDict 按最近访问排序
+        self._shards: List["OrderedDict[str, Deque[int]]"] = [OrderedDict() for _ in range(self.SHARDS)]
+        
+        self.mode = mode
+        self._tbf = (
+            TimeLimitedBloomFilter(size=bloom_size, hashes=bloom_hashes, window_size=self.window_size)
+            if mode == "bloom" else None
+        )
         
-        logger.info(f"Rate limiter initialized: {requests_per_minute} requests/minute")
+        logger.info(f"Rate limiter initialized: {requests_per_minute} requests/minute, mode: {mode}")
     
-    def _get_client_ip(self, request: Request) -> str:
+    def _get_client_ip(self, scope: Scope) -> str:
         """
         获取客户端真实IP地址
         考虑代理和负载均衡器的情况
         """
+        # ASGI 的请求头为 (小写名称, 值) 的字节元组列表，单次遍历同时取出两个代理头
+        forwarded_for = real_ip = None
+        for key, value in scope["headers"]:
+            if key == b"x-forwarded-for":
+                if forwarded_for is None:
+                    forwarded_for = value
+            elif key == b"x-real-ip":
+                if real_ip is None:
+                    real_ip = value
+            else:
+                continue
+            if forwarded_for is not None and real_ip is not None:
+                break
+        
         # 优先检查代理头
-        forwarded_for = request.headers.get("X-Forwarded-For")
         if forwarded_for:
             # X-Forwarded-For可能包含多个IP，取第一个
-            return forwarded_for.split(",")[0].strip()
+            comma = forwarded_for.find(b",")
+            if comma >= 0:
+                forwarded_for = forwarded_for[:comma]
+            return forwarded_for.strip().decode("latin-1")
         
-        real_ip = request.headers.get("X-Real-IP")
         if real_ip:
-            return real_ip.strip()
+            return real_ip.strip().decode("latin-1")
         
         # 回退到直接连接IP
-        return request.client.host if request.client else "unknown"
+        client = scope.get("client")
+        return client[0] if client else "unknown"
     
-    def _cleanup_expired_records(self):
+    def _evict_stale_ips(self, shard: "OrderedDict[str, Deque[int]]", cutoff_time: int):
         """
-        清理过期的请求记录
-        """
-        current_time = time.time()
-        
-        # 检查是否需要清理
-        if current_time - self.last_cleanup < self.cleanup_interval:
-            return
-        
-        cutoff_time = current_time - self.window_size
-        cleaned_ips = []
-        
-        for ip, timestamps in list(self.ip_requests.items()):
-            # 过滤掉过期的时间戳
-            valid_timestamps = [ts for ts in timestamps if ts > cutoff_time]
-            
-            if valid_timestamps:
-                self.ip_requests[ip] = valid_timestamps
-            else:
-                # 如果没有有效时间戳，删除这个IP记录
-                del self.ip_requests[ip]
-                cleaned_ips.append(ip)
-        
-        self.last_cleanup = current_time
+        分片内IP数超过上限时，从最久未访问的一端淘汰窗口内已无请求的IP
         
-        if cleaned_ips:
-            logger.debug(f"Cleaned up expired records for {len(cleaned_ips)} IPs")
+        淘汰分摊到每次写入中完成，无需定期遍历全部IP
+        """
+        while len(shard) > self._max_ips_per_shard:
+            ip, timestamps = next(iter(shard.items()))
+            # 最久未访问的IP仍有窗口内的请求，说明其余IP也都是活跃的，停止淘汰
+            if timestamps and timestamps[-1] > cutoff_time:
+                break
+            del shard[ip]
     
     def _is_rate_limited(self, ip: str) -> Tuple[bool, int, int]:
         """
@@ -108,52 +141,61 @@ class RateLimiterMiddleware(BaseHTTPMiddleware):
         Returns:
             Tuple[bool, int, int]: (是否限制, 当前请求数, 剩余请求数)
         """
-        current_time = time.time()
-        cutoff_time = current_time - self.window_size
+        if self._tbf is not None:
+            limited, current_requests = self._tbf.increment_and_check(ip, self.requests_per_minute)
+            return limited, current_requests, max(0, self.requests_per_minute - current_requests)
         
-        # 获取该IP的请求记录
-        if ip not in self.ip_requests:
-            self.ip_requests[ip] = []
+        current_time = time.monotonic_ns()
+        cutoff_time = current_time - self._window_ns
         
-        # 过滤掉过期的请求
-        valid_requests = [ts for ts in self.ip_requests[ip] if ts > cutoff_time]
-        self.ip_requests[ip] = valid_requests
+        # 获取该IP的请求记录（定长队列，超出上限时自动丢弃最早的记录）
+        shard = self._shards[hash(ip) % self.SHARDS]
+        timestamps = shard.get(ip)
+        if timestamps is None:
+            timestamps = shard[ip] = deque(maxlen=self.requests_per_minute)
+            self._evict_stale_ips(shard, cutoff_time)
+        else:
+            shard.move_to_end(ip)
         
-        current_requests = len(valid_requests)
-        remaining_requests = max(0, self.requests_per_minute - current_requests)
+        # 从队首移除过期的请求，均摊 O(1)，无需每次重建列表
+        while timestamps and timestamps[0] <= cutoff_time:
+            timestamps.popleft()
         
-        # 检查是否超限
-        is_limited = current_requests >= self.requests_per_minute
+        current_requests = len(timestamps)
         
-        if not is_limited:
-            # 记录当前请求
-            self.ip_requests[ip].append(current_time)
-            current_requests += 1
-            remaining_requests -= 1
+        # 检查是否超限
+        if current_requests >= self.requests_per_minute:
+            return True, current_requests, 0
         
-        return is_limited, current_requests, remaining_requests
+        # 记录当前请求
+        timestamps.append(current_time)
+        return False, current_requests + 1, self.requests_per_minute - current_requests - 1
     
-    def _add_rate_limit_headers(self, response: Response, current_requests: int, remaining_requests: int):
+    def _rate_limit_headers(self, remaining_requests: int) -> List[Tuple[bytes, bytes]]:
         """
-        添加速率限制相关的响应头
+        生成速率限制相关的响应头
         """
-        response.headers["X-RateLimit-Limit"] = str(self.requests_per_minute)
-        response.headers["X-RateLimit-Remaining"] = str(remaining_requests)
-        response.headers["X-RateLimit-Reset"] = str(int(time.time() + self.window_size))
-        response.headers["X-RateLimit-Window"] = str(self.window_size)
+        return [
+            self._limit_header,
+            (b"x-ratelimit-remaining", self._remaining_values[remaining_requests]),
+            (b"x-ratelimit-reset", str(int(time.time() + self.window_size)).encode()),
+            self._window_header,
+        ]
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         """
         处理请求的中间件逻辑
         """
-        # 定期清理过期记录
-        self._cleanup_expired_records()
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
         # 获取客户端IP
-        client_ip = self._get_client_ip(request)
+        client_ip = self._get_client_ip(scope)
         
         # 检查速率限制
         is_limited, current_requests, remaining_requests = self._is_rate_limited(client_ip)
+        rate_limit_headers = self._rate_limit_headers(remaining_requests)
         
         if is_limited:
             # 记录限制日志
@@ -162,31 +204,35 @@ class RateLimiterMiddleware(BaseHTTPMiddleware):
                 f"{current_requests}/{self.requests_per_minute} requests in {self.window_size}s"
             )
             
-            # 返回429错误
-            error_response = JSONResponse(
-                status_code=429,
-                content={
-                    "error": "Rate limit exceeded",
-                    "message": f"Too many requests. Limit: {self.requests_per_minute} requests per minute",
-                    "retry_after": self.window_size
-                }
-            )
-            
-            # 添加速率限制头
-            self._add_rate_limit_headers(error_response, current_requests, remaining_requests)
-            
-            return error_response
+            # 直接返回429错误
+            body = orjson.dumps({
+                "error": "Rate limit exceeded",
+                "message": f"Too many requests. Limit: {self.requests_per_minute} requests per minute",
+                "retry_after": self.window_size
+            })
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    *rate_limit_headers
+                ]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
         
-        # 继续处理请求
-        response = await call_next(request)
+        async def send_with_headers(message: Message):
+            # 在响应开始时追加速率限制头，响应体直接透传
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), *rate_limit_headers]
+            await send(message)
         
-        # 添加速率限制头到正常响应
-        self._add_rate_limit_headers(response, current_requests, remaining_requests)
+        # 继续处理请求
+        await self.app(scope, receive, send_with_headers)
         
         # 记录请求日志（仅在debug模式）
         logger.debug(
-            f"Request from {client_ip}: {current_requests}/{self.requests_per_minute}, "
-            f"remaining: {remaining_requests}"
+            "Request from %s: %d/%d, remaining: %d",
+            client_ip, current_requests, self.requests_per_minute, remaining_requests
         )
-        
-        return response
\ No newline at end of file
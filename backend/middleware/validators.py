@@ -1,18 +1,41 @@
 # -*- coding: utf-8 -*-
 """
-Validation Middleware for LifeTracer
-人物姓名验证中间件
+Input Validators for LifeTracer
+人物姓名验证
 """
 
 import re
 from typing import Optional, Tuple
-from fastapi import Request
-from fastapi.responses import JSONResponse
 from utils.logger import get_logger
 
+try:
+    import hyperscan
+except ImportError:  # 可选依赖，未安装时使用 re 检查危险字符
+    hyperscan = None
+
 logger = get_logger(__name__)
 
 
+def _build_dangerous_database():
+    """
+    将危险字符模式编译为 Hyperscan 数据库（单次扫描、无回溯）
+    
+    以 UTF-8 模式匹配 Unicode 码点，C1 控制字符 U+007F-U+009F 不会误匹配多字节字符中的字节
+    """
+    database = hyperscan.Database()
+    database.compile(
+        expressions=[
+            rb'[<>"\'/\\\x00-\x1f\x{7f}-\x{9f}]'
+            rb'|script|javascript|vbscript'
+            rb'|select|insert|update|delete|drop|union'
+            rb'|--|/\*|\*/|;'
+        ],
+        ids=[0],
+        flags=[hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH]
+    )
+    return database
+
+
 class InputValidator:
     """
     验证器
@@ -24,23 +47,48 @@ class InputValidator:
     - 格式规范化：统一输入格式
     """
     
-    # 中文姓名模式：支持汉字、·（间隔号）
-    CHINESE_NAME_PATTERN = re.compile(r'^[\u4e00-\u9fff·]{1,20}$')
+    # 姓名格式：汉字、·（间隔号）、字母、空格、连字符、撇号、点号，支持中文、英文及中英文混合姓名
+    # （原先分别匹配的中文、英文、混合三种模式中，混合模式已涵盖另外两种，合并为一次匹配）
+    NAME_FORMAT_REGEX = re.compile(r'^[\u4e00-\u9fff·a-zA-Z\s\-\'\.À-\u017F]{1,50}$')
+    
+    # 危险字符模式：HTML/XML标签字符、控制字符、脚本关键词、SQL关键词、SQL注释字符
+    # 合并为一个正则，一次扫描完成检查
+    DANGEROUS_REGEX = re.compile(
+        r'[<>"\'\/\\\x00-\x1f\x7f-\x9f]'
+        r'|script|javascript|vbscript'
+        r'|select|insert|update|delete|drop|union'
+        r'|\-\-|\/\*|\*\/|;',
+        re.IGNORECASE
+    )
     
-    # 英文姓名模式：支持字母、空格、连字符、撇号、点号
-    ENGLISH_NAME_PATTERN = re.compile(r'^[a-zA-Z\s\-\'\.À-\u017F]{1,50}$')
+    # Hyperscan 数据库（已安装时使用）
+    DANGEROUS_DATABASE = _build_dangerous_database() if hyperscan is not None else None
     
-    # 混合姓名模式：中英文混合（如：李小明 John）
-    MIXED_NAME_PATTERN = re.compile(r'^[\u4e00-\u9fff·a-zA-Z\s\-\'\.À-\u017F]{1,50}$')
+    # 必须包含至少一个汉字或字母
+    CONTAINS_LETTER_REGEX = re.compile(r'[\u4e00-\u9fffa-zA-Z]')
     
-    # 危险字符模式：SQL注入、XSS等攻击字符
-    DANGEROUS_PATTERNS = [
-        re.compile(r'[<>"\'\/\\]'),  # HTML/XML标签字符
-        re.compile(r'(script|javascript|vbscript)', re.IGNORECASE),  # 脚本关键词
-        re.compile(r'(select|insert|update|delete|drop|union)', re.IGNORECASE),  # SQL关键词
-        re.compile(r'[\x00-\x1f\x7f-\x9f]'),  # 控制字符
-        re.compile(r'(\-\-|\/\*|\*\/|;)'),  # SQL注释字符
-    ]
+    # 连续空白字符
+    WHITESPACE_REGEX = re.compile(r'\s+')
+    
+    @classmethod
+    def contains_dangerous(cls, text: str) -> bool:
+        """检查文本是否包含危险字符或关键词"""
+        if cls.DANGEROUS_DATABASE is not None:
+            try:
+                data = text.encode('utf-8')
+            except UnicodeEncodeError:
+                # 含孤立代理项等无法编码为合法 UTF-8 的文本，交给 re 处理
+                return cls.DANGEROUS_REGEX.search(text) is not None
+            matched = False
+            
+            def on_match(*args) -> bool:
+                nonlocal matched
+                matched = True
+                return True  # 命中即终止扫描
+            
+            cls.DANGEROUS_DATABASE.scan(data, match_event_handler=on_match)
+            return matched
+        return cls.DANGEROUS_REGEX.search(text) is not None
     
     @classmethod
     def validate_person_name(cls, name: str) -> Tuple[bool, Optional[str], Optional[str]]:
@@ -71,89 +119,21 @@ class InputValidator:
             return False, None, "姓名长度不能少于1个字符"
         
         # 危险字符检查
-        for pattern in cls.DANGEROUS_PATTERNS:
-            if pattern.search(cleaned_name):
-                logger.warning(f"Detected dangerous characters in name: {name}")
-                return False, None, "姓名包含不允许的字符"
+        if cls.contains_dangerous(cleaned_name):
+            logger.warning(f"Detected dangerous characters in name: {name}")
+            return False, None, "姓名包含不允许的字符"
         
         # 格式验证
-        is_valid_format = (
-            cls.CHINESE_NAME_PATTERN.match(cleaned_name) or
-            cls.ENGLISH_NAME_PATTERN.match(cleaned_name) or
-            cls.MIXED_NAME_PATTERN.match(cleaned_name)
-        )
-        
-        if not is_valid_format:
+        if not cls.NAME_FORMAT_REGEX.match(cleaned_name):
             return False, None, "姓名格式不正确，请输入有效的中文或英文姓名"
         
         # 进一步清理：规范化空格
-        normalized_name = re.sub(r'\s+', ' ', cleaned_name)
+        normalized_name = cls.WHITESPACE_REGEX.sub(' ', cleaned_name)
         
         # 检查是否为纯空格或特殊字符
-        if not re.search(r'[\u4e00-\u9fffa-zA-Z]', normalized_name):
+        if not cls.CONTAINS_LETTER_REGEX.search(normalized_name):
             return False, None, "姓名必须包含有效的中文或英文字符"
         
         logger.debug(f"Name validation passed: {normalized_name}")
         return True, normalized_name, None
 
-
-async def validate_person_name_middleware(request: Request, call_next):
-    """
-    人物姓名验证中间件
-    
-    对 /api/biography 接口的请求进行人物姓名验证
-    """
-    # 只对 /api/biography 接口进行验证
-    if request.url.path == "/api/biography" and request.method == "POST":
-        try:
-            # 获取请求体
-            body = await request.body()
-            if body:
-                import json
-                try:
-                    request_data = json.loads(body)
-                    name = request_data.get("name")
-                    
-                    if name:
-                        # 验证人物姓名
-                        is_valid, cleaned_name, error_msg = InputValidator.validate_person_name(name)
-                        if not is_valid:
-                            logger.error(f"Name validation failed: {error_msg}")
-                            return JSONResponse(
-                                status_code=400,
-                                content={
-                                    "error": "输入验证失败",
-                                    "message": error_msg,
-                                    "field": "name"
-                                }
-                            )
-                        
-                        # 更新请求数据中的姓名为清理后的版本
-                        request_data["name"] = cleaned_name
-                        
-                        # 重新构造请求体
-                        new_body = json.dumps(request_data).encode()
-                        
-                        # 创建新的请求对象
-                        async def receive():
-                            return {"type": "http.request", "body": new_body}
-                        
-                        request._receive = receive
-                        
-                except json.JSONDecodeError:
-                    pass  # 如果不是JSON格式，让后续处理
-                    
-        except Exception as e:
-            logger.error(f"Validation middleware error: {str(e)}")
-            # 中间件出错时抛出验证异常，不继续处理请求
-            return JSONResponse(
-                status_code=500,
-                content={
-                    "error": "验证中间件错误",
-                    "message": "请求验证过程中发生内部错误",
-                    "field": "validation"
-                }
-            )
-    
-    response = await call_next(request)
-    return response
\ No newline at end of file
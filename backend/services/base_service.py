@@ -4,8 +4,8 @@ Base service class with common functionality
 """
 import aiohttp
 from abc import ABC
+from utils.http_client import get_session as get_shared_session
 from utils.logger import LoggerMixin
-from typing import Optional
 
 
 class BaseService(LoggerMixin, ABC):
@@ -13,25 +13,19 @@ class BaseService(LoggerMixin, ABC):
     Base service class providing common functionality like session management
     """
     
-    def __init__(self):
-        self.session: Optional[aiohttp.ClientSession] = None
-        
     async def get_session(self) -> aiohttp.ClientSession:
         """
-        Get or create HTTP session
+        Get the process-wide shared HTTP session
         """
-        if self.session is None:
-            timeout = aiohttp.ClientTimeout(total=30)  # 30 second timeout
-            self.session = aiohttp.ClientSession(timeout=timeout)
-        return self.session
+        return await get_shared_session()
     
     async def close(self):
         """
         Clean up resources
+        
+        The shared HTTP session outlives individual services and is closed on
+        application shutdown via utils.http_client.close_session
         """
-        if self.session:
-            await self.session.close()
-            self.session = None
     
     async def __aenter__(self):
         """Async context manager entry"""
@@ -1,25 +1,138 @@
 # -*- coding: utf-8 -*-
 import asyncio
-from typing import Dict, List, Any
-import json
-import sys
+import hashlib
+import logging
+import re
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Awaitable, Dict, List, Optional, Set
+from operator import itemgetter
+import orjson
 import os
-# 添加backend目录到Python路径
-sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
 
 from models.response_models import BiographyData
 from caching.cache_factory import get_cache_manager
+from caching.memory_cache import MemoryCache
 from llm.llm_client import LLMClient
-from llm.prompts import CITY_COORDINATES_PROMPT, LIFE_TRAJECTORY_PROMPT, LIFE_TRAJECTORY_WITH_COORDINATES_PROMPT
+from llm.prompts import (
+    CITY_COORDINATES_PROMPT,
+    LIFE_TRAJECTORY_PROMPT,
+    LIFE_TRAJECTORY_WITH_COORDINATES_PROMPT,
+    LIFE_TRAJECTORY_BATCH_PROMPT,
+)
 from .base_service import BaseService
 from utils.error_handler import handle_service_error, WikipediaError, LLMError, log_and_raise_error
 from utils.html_parser import HTMLParser
+from utils.async_batcher import AsyncBatcher
+
+if TYPE_CHECKING:
+    from llm.langchain_processor import LangChainProcessor
+
+# 段落分隔：两个换行之间可夹杂任意空白（兼容 \r\n 和全角空格等 Unicode 空白）
+_PARA_RE = re.compile(r"\s*\n\s*\n\s*")
+
+# 模式3合并段落请求的消息前缀
+_BATCH_MESSAGE_PREFIX = "请分别分析以下人物生平段落，提取轨迹数据和坐标信息：\n\n"
+
+
+@lru_cache(maxsize=None)
+def _batch_system_prompt(max_trajectories: int) -> str:
+    """
+    模式3的系统提示词：在合并解析提示词后追加轨迹数量限制
+    
+    轨迹数上限只有 1-10 几种取值，拼接结果按取值缓存，每次请求直接复用
+    """
+    return (
+        LIFE_TRAJECTORY_BATCH_PROMPT
+        + f"\n\n重要规则：由于这是分段解析，请严格控制每个段落输出的轨迹点数量不超过{max_trajectories}个，优先选择最重要的轨迹点。"
+    )
+
+# 从坐标字典中按 [经度, 纬度] 顺序取值
+_get_lonlat = itemgetter("longitude", "latitude")
+
+
+def _has_coordinates(point: Any) -> bool:
+    """轨迹点是否带有完整的经纬度"""
+    if not isinstance(point, dict):
+        return False
+    coords = point.get("coordinates")
+    return isinstance(coords, dict) and coords.get("longitude") is not None and coords.get("latitude") is not None
+
+
+def _hashed_key(prefix: str, *parts: str) -> str:
+    """
+    生成定长缓存键：前缀 + 各部分内容的 blake2b 摘要
+    
+    人名、页面标题和正文长度不定，哈希后键长固定，不受 Redis 键长和文件名长度限制
+    """
+    digest = hashlib.blake2b("|".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+    return f"{prefix}_{digest}"
+
+
+def _merge_paragraphs(paragraphs: List[str], min_length: int) -> List[str]:
+    """
+    单次从左到右扫描：缓冲区长度不足 min_length 时继续吸收后续段落，
+    足够长后整体用 "\n\n" 拼接输出，避免逐次拼接字符串产生中间对象
+    """
+    merged = []
+    buffer = [paragraphs[0]]
+    buffer_length = len(paragraphs[0])
+    for paragraph in paragraphs[1:]:
+        if buffer_length < min_length:
+            buffer.append(paragraph)
+            buffer_length += len(paragraph) + 2
+        else:
+            merged.append("\n\n".join(buffer))
+            buffer = [paragraph]
+            buffer_length = len(paragraph)
+    merged.append("\n\n".join(buffer))
+    return merged
+
+
+class _CoordinateBatcher(AsyncBatcher):
+    """合并多个请求的地点坐标查询：去重后一次LLM调用，再按地点名分发结果"""
+    
+    def __init__(self, llm_client: LLMClient, max_batch_size: int = 32, max_queue_time: float = 0.05):
+        super().__init__(max_batch_size=max_batch_size, max_queue_time=max_queue_time)
+        self.llm_client = llm_client
+    
+    async def process_batch(self, batch: List[List[str]]) -> List[Dict[str, Any]]:
+        places = list(dict.fromkeys(place for request in batch for place in request))
+        # 地点之间用顿号分隔
+        response = await self.llm_client.chat(
+            message=f"请提供以下城市或地点的坐标信息：{'、'.join(places)}",
+            system_prompt=CITY_COORDINATES_PROMPT
+        )
+        locations = orjson.loads(response).get("locations") or []
+        if len(locations) == len(places):
+            by_place = dict(zip(places, locations))
+        else:
+            # 数量不一致时无法按顺序对应，改用返回的城市名匹配
+            by_place = {location.get("city"): location for location in locations}
+        
+        return [
+            {"locations": [{**by_place[place], "city": place} for place in request if place in by_place]}
+            for request in batch
+        ]
 
-from llm.langchain_processor import LangChainProcessor, ProcessingConfig
 
 class BiographyService(BaseService):
     # 静态类变量：短段落合并的最小字符数阈值
     MIN_PARAGRAPH_LENGTH = 200
+    # 模式3中每次LLM请求合并处理的段落数
+    PARAGRAPHS_PER_REQUEST = 3
+    # LangChain处理器初始化失败后的重试间隔（秒），每次失败翻倍直到上限
+    LANGCHAIN_RETRY_INITIAL = 5
+    LANGCHAIN_RETRY_MAX = 300
+    # 维基百科生平段落的缓存时间（秒），页面内容很少变化，缓存时间长于生平结果
+    WIKI_CACHE_EXPIRE = 7 * 24 * 3600
+    # 地点坐标的缓存时间（秒）
+    COORD_CACHE_EXPIRE = 30 * 24 * 3600
+    # 搜索建议的缓存时间（秒），自动补全请求量大且结果短时间内基本不变
+    SUGGESTION_CACHE_EXPIRE = 300
+    # 缓存键经过哈希无法按前缀匹配，失效时枚举请求可能使用的语言和详细程度组合
+    CACHE_LANGUAGES = ("zh", "zh-hans", "en")
+    CACHE_DETAIL_LEVELS = ("basic", "medium", "detailed")
     
     def __init__(self):
         super().__init__()
@@ -27,30 +140,104 @@ class BiographyService(BaseService):
         # 通过环境变量 CACHE_TYPE 或 REDIS_URL 控制
         self.cache = get_cache_manager()
         self.llm_client = LLMClient(os.environ.get("OPENAI_API_KEY"))
-        # 请求去重锁字典，防止并发请求同一人物时重复调用API
-        self._request_locks = {}
+        self._coord_batcher = _CoordinateBatcher(self.llm_client)
+        # 进行中的请求，格式: {cache_key: asyncio.Future}，防止并发请求同一人物时重复调用API
+        # 请求完成后立即移除，内存占用与当前并发请求数成正比
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # 已校验的 BiographyData 实例，热门人物命中时跳过反序列化和 Pydantic 校验
+        self._bio_cache = MemoryCache(maxsize=512, ttl=3600)
+        # 后台进行中的缓存写入任务，关闭服务时等待其完成
+        self._pending_writes: Set[asyncio.Task] = set()
+        # 是否已订阅缓存失效通知，需在事件循环中订阅，首次请求时进行
+        self._invalidation_subscribed = False
         
-        # 初始化LangChain处理器
-        try:
-            self._langchain_processor = LangChainProcessor(
-                api_key=os.environ.get("OPENAI_API_KEY")
-            )
-            self.logger.info("LangChain处理器初始化成功")
-        except Exception as e:
-            self.logger.warning(f"LangChain处理器初始化失败: {str(e)}")
-            self._langchain_processor = None
+        # LangChain处理器在模式4首次使用时才创建，初始化失败后按退避间隔重试
+        self._langchain_processor = None
+        self._langchain_lock = asyncio.Lock()
+        self._langchain_retry_delay = self.LANGCHAIN_RETRY_INITIAL
+        self._langchain_next_retry = 0.0
     
     async def close(self):
-        """Override parent close to also clear locks"""
+        """Override parent close to also flush cache writes and release the LangChain processor"""
+        if self._pending_writes:
+            await asyncio.gather(*self._pending_writes, return_exceptions=True)
         await super().close()
-        # 清理所有锁
-        self._request_locks.clear()
         # 清理LangChain处理器
         if self._langchain_processor:
             await self._langchain_processor.close()
             self._langchain_processor = None
     
-    # 为了简化代码和避免竞态条件，我们不主动清理锁对象
+    def _cache_in_background(self, write: Awaitable[Any]) -> None:
+        """
+        在后台执行缓存写入，不让请求等待缓存的网络往返
+        
+        Args:
+            write: 缓存写入协程，如 self.cache.set(...)
+        """
+        task = asyncio.create_task(write)
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
+    
+    def _subscribe_invalidations(self) -> None:
+        """订阅其他进程发布的缓存失效通知，清除本进程的 BiographyData 缓存"""
+        self._invalidation_subscribed = True
+        # 文件缓存不支持跨进程通知，依靠 _bio_cache 的 ttl 过期
+        if hasattr(self.cache, "subscribe_invalidations"):
+            self.cache.subscribe_invalidations(self._evict_local)
+    
+    def _evict_local(self, keys: List[str]) -> None:
+        for key in keys:
+            self._bio_cache.delete(key)
+    
+    async def invalidate(self, name: str) -> None:
+        """
+        使某个人物的生平缓存失效（各语言和详细程度的生平结果及维基百科段落）
+        
+        Redis 缓存会通过 pub/sub 通知其他进程清除各自的进程内缓存
+        
+        Args:
+            name: 人物姓名
+        """
+        keys = [
+            _hashed_key("bio", name, language, detail_level)
+            for language in self.CACHE_LANGUAGES
+            for detail_level in self.CACHE_DETAIL_LEVELS
+        ]
+        keys.extend(_hashed_key("wiki_section", language, name) for language in self.CACHE_LANGUAGES)
+        self._evict_local(keys)
+        await self.cache.invalidate(keys)
+        self.logger.info(f"已使 {name} 的缓存失效")
+    
+    async def _get_langchain(self) -> Optional["LangChainProcessor"]:
+        """
+        获取LangChain处理器，首次调用时在线程中创建，避免阻塞事件循环
+        
+        Returns:
+            处理器实例；初始化失败且尚未到重试时间时返回 None
+        """
+        if self._langchain_processor is not None:
+            return self._langchain_processor
+        
+        async with self._langchain_lock:
+            if self._langchain_processor is not None:
+                return self._langchain_processor
+            if time.monotonic() < self._langchain_next_retry:
+                return None
+            
+            try:
+                # LangChain 的导入开销较大，仅在首次使用模式4时导入
+                from llm.langchain_processor import LangChainProcessor
+                self._langchain_processor = await asyncio.to_thread(
+                    LangChainProcessor, api_key=os.environ.get("OPENAI_API_KEY")
+                )
+                self._langchain_retry_delay = self.LANGCHAIN_RETRY_INITIAL
+                self.logger.info("LangChain处理器初始化成功")
+            except Exception as e:
+                self._langchain_next_retry = time.monotonic() + self._langchain_retry_delay
+                self.logger.warning(f"LangChain处理器初始化失败: {str(e)}，{self._langchain_retry_delay}秒后重试")
+                self._langchain_retry_delay = min(self._langchain_retry_delay * 2, self.LANGCHAIN_RETRY_MAX)
+            return self._langchain_processor
+    
     @handle_service_error
     async def get_biography(self, name: str, language: str = "zh-hans", detail_level: str = "medium", parse_mode: int = 3) -> BiographyData:
         """
@@ -63,86 +250,141 @@ class BiographyService(BaseService):
             detail_level: 详细程度
             parse_mode: 解析模式
         """
-        cache_key = f"biography_{name}_{language}_{detail_level}"
+        if not self._invalidation_subscribed:
+            self._subscribe_invalidations()
+        
+        cache_key = _hashed_key("bio", name, language, detail_level)
+        
+        biography = self._bio_cache.get(cache_key)
+        if biography is not None:
+            return biography
         
         # 第一次检查缓存
         cached_data = await self.cache.get(cache_key)
-        if cached_data:
+        # 忽略没有轨迹点的缓存条目（修复前可能写入过空结果）
+        if cached_data and cached_data.get("coordinates"):
             self.logger.info(f"从缓存获取 {name} 的生平信息")
-            return BiographyData(**cached_data)
-        
-        # 获取或创建该缓存键的锁（原子操作，避免竞态条件）
-        lock = self._request_locks.setdefault(cache_key, asyncio.Lock())
-        
-        # 使用锁确保同一时间只有一个请求在处理
-        async with lock:
-            # 再次检查缓存（可能在等待锁的过程中其他请求已经完成并缓存了结果）
-            cached_data = await self.cache.get(cache_key)
-            if cached_data:
-                self.logger.info(f"等待期间从缓存获取 {name} 的生平信息")
-                return BiographyData(**cached_data)
-            
-            # 执行实际的数据获取逻辑
-            self.logger.info(f"开始处理 {name} 的生平信息请求")
+            biography = BiographyData(**cached_data)
+            self._bio_cache.set(cache_key, biography)
+            return biography
+        
+        # 同一缓存键已有请求在处理时，直接等待其结果，不再重复调用API，也无需再读一次缓存
+        future = self._inflight.get(cache_key)
+        while future is not None:
+            self.logger.info(f"等待进行中的 {name} 生平信息请求")
             try:
-                # 1. 从维基百科获取基础信息
-                wiki_data = await self._get_wikipedia_data(name, language)
-                self.logger.info(f"获取维基百科数据成功")
-
-                # 2. 根据parse_mode选择不同的解析策略
-                if parse_mode == 1:
-                    # 模式1：串行调用（1+N次请求）
-                    trajectory_data = await self._parse_mode_1(wiki_data)
-                elif parse_mode == 2:
-                    # 模式2：合并调用（1次请求）
-                    trajectory_data = await self._parse_mode_2(wiki_data)
-                elif parse_mode == 3:
-                    # 模式3：并发调用（基于自然段分隔）
-                    trajectory_data = await self._parse_mode_3(wiki_data)
-                elif parse_mode == 4:
-                    # 模式4：LangChain智能解析
-                    trajectory_data = await self._parse_mode_4(wiki_data)
-                else:
-                    raise ValueError(f"不支持的parse_mode: {parse_mode}")
-                
-                self.logger.info(f"使用模式{parse_mode}解析完成")
-                
-                # 3. 处理返回的数据
-                coordinates = []
-                descriptions = []
-                
-                for trajectory in trajectory_data["trajectory"]:
-                    # 提取坐标信息
-                    coords = trajectory["coordinates"]
-                    coordinates.append([coords["longitude"], coords["latitude"]])
-                    # 提取描述信息
-                    descriptions.append(trajectory["time"] + "," + trajectory["description"])
-                
-                biography = BiographyData(
-                    name=name,
-                    coordinates=coordinates,
-                    descriptions=descriptions
-                )
-                self.logger.info(f"数据处理完成")
-                # 4. 缓存结果
-                await self.cache.set(cache_key, biography.dict(), expire=3600*24)  # 缓存24小时
-                
-                self.logger.info(f"成功获取并缓存 {name} 的生平信息")
-                return biography
-                
-            except Exception as e:
-                log_and_raise_error(
-                    error_type=LLMError,
-                    message=f"无法获取 {name} 的生平信息",
-                    error_code="BIOGRAPHY_EXTRACTION_FAILED",
-                    original_exception=e,
-                    details={"name": name, "language": language, "detail_level": detail_level}
-                )
+                # shield：等待方被取消时不影响正在处理的请求
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # 只有发起请求的一方被取消（客户端断开、超时等）时才继续，由等待方自己重新获取
+                if not future.cancelled():
+                    raise
+            future = self._inflight.get(cache_key)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
+        try:
+            biography = await self._fetch_biography(name, language, detail_level, parse_mode, cache_key)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 标记异常已被获取，没有等待方时不会输出 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            self._bio_cache.set(cache_key, biography)
+            future.set_result(biography)
+            return biography
+        finally:
+            del self._inflight[cache_key]
     
+    async def _fetch_biography(self, name: str, language: str, detail_level: str, parse_mode: int, cache_key: str) -> BiographyData:
+        """
+        实际获取并解析生平信息，结果写入缓存
+        """
+        # 执行实际的数据获取逻辑
+        self.logger.info(f"开始处理 {name} 的生平信息请求")
+        try:
+            # 模式4下LangChain处理器的初始化与维基百科请求并行进行
+            if parse_mode == 4:
+                warmup_task = asyncio.create_task(self._get_langchain())
+            
+            # 1. 从维基百科获取基础信息
+            wiki_data = await self._get_wikipedia_data(name, language)
+            self.logger.info(f"获取维基百科数据成功")
+            
+            if parse_mode == 4:
+                await warmup_task
+
+            # 2. 根据parse_mode选择不同的解析策略
+            # 解析结果按文本内容哈希缓存，指向同一页面的不同名字无需再次调用LLM
+            trajectory_key = _hashed_key(f"traj_{parse_mode}", wiki_data)
+            trajectory_data = await self.cache.get(trajectory_key)
+            if trajectory_data:
+                self.logger.info(f"从缓存获取解析结果")
+            elif parse_mode == 1:
+                # 模式1：分步调用（1+1次请求）
+                trajectory_data = await self._parse_mode_1(wiki_data)
+            elif parse_mode == 2:
+                # 模式2：合并调用（1次请求）
+                trajectory_data = await self._parse_mode_2(wiki_data)
+            elif parse_mode == 3:
+                # 模式3：并发调用（基于自然段分隔）
+                trajectory_data = await self._parse_mode_3(wiki_data)
+            elif parse_mode == 4:
+                # 模式4：LangChain智能解析
+                trajectory_data = await self._parse_mode_4(wiki_data)
+            else:
+                raise ValueError(f"不支持的parse_mode: {parse_mode}")
+            
+            self.logger.info(f"使用模式{parse_mode}解析完成")
+            if trajectory_data.get("trajectory"):
+                self._cache_in_background(self.cache.set(trajectory_key, trajectory_data, expire=self.WIKI_CACHE_EXPIRE))
+            
+            # 3. 处理返回的数据：提取坐标信息和描述信息
+            # 个别轨迹点缺少坐标时跳过该点，不让单条格式错误的输出导致整个请求失败
+            points = [t for t in trajectory_data.get("trajectory") or [] if _has_coordinates(t)]
+            coordinates = [list(_get_lonlat(t["coordinates"])) for t in points]
+            descriptions = [f'{t.get("time", "")},{t.get("description", "")}' for t in points]
+            # 没有任何可用轨迹点时视为失败，不返回也不缓存空结果
+            if not coordinates:
+                raise ValueError("未能提取到任何带坐标的轨迹点")
+            
+            biography = BiographyData(
+                name=name,
+                coordinates=coordinates,
+                descriptions=descriptions
+            )
+            self.logger.info(f"数据处理完成")
+            # 4. 缓存结果
+            self._cache_in_background(self.cache.set(cache_key, biography.model_dump(mode="json"), expire=3600*24))  # 缓存24小时
+            
+            self.logger.info(f"成功获取并缓存 {name} 的生平信息")
+            return biography
+            
+        except Exception as e:
+            log_and_raise_error(
+                error_type=LLMError,
+                message=f"无法获取 {name} 的生平信息",
+                error_code="BIOGRAPHY_EXTRACTION_FAILED",
+                original_exception=e,
+                details={"name": name, "language": language, "detail_level": detail_level}
+            )
+
     async def _get_wikipedia_data(self, name: str, language: str) -> Dict[str, Any]:
         """
         从维基百科获取人物信息
         """
+        # 维基百科段落单独缓存：生平结果过期或解析模式变化时无需重新请求维基百科
+        # 缓存层已负责序列化和压缩，这里直接存储文本
+        wiki_cache_key = _hashed_key("wiki_section", language, name)
+        cached_section = await self.cache.get(wiki_cache_key)
+        if cached_section:
+            self.logger.info(f"从缓存获取 {name} 的维基百科内容")
+            return cached_section
+        
         session = await self.get_session()
         
         # 根据语言选择维基百科域名
@@ -156,60 +398,139 @@ class BiographyService(BaseService):
                 "format": "json",
                 "list": "search",
                 "srsearch": name,
-                "srlimit": 5,
+                # 只使用前两个结果的标题和最后修改时间
+                "srlimit": 2,
+                "srprop": "timestamp",
+                "formatversion": 2,
                 "variant": language == "zh" and "zh-hans" or language
             }
             
-            self.logger.debug(f"正在搜索维基百科: {name}")
-            self.logger.debug(f"搜索URL: {search_url}")
-            self.logger.debug(f"搜索参数: {search_params}")
-            
-            async with session.get(search_url, params=search_params) as response:
-                search_data = await response.json()
-            
-            self.logger.debug(f"搜索结果: {json.dumps(search_data, ensure_ascii=False, indent=2)}")
-            
-            if not search_data.get("query", {}).get("search"):
-                log_and_raise_error(
-                    error_type=WikipediaError,
-                    message=f"在维基百科中未找到 {name} 的相关信息",
-                    error_code="NO_SEARCH_RESULTS",
-                    details={"name": name, "language": language}
-                )
-            
-            # 获取最相关的页面标题
-            page_title = search_data["query"]["search"][0]["title"]
-            self.logger.debug(f"找到页面: {page_title}")
-            
-            # 2. 获取页面内容
             content_params = {
                 "action": "parse",
                 "format": "json",
-                "page": page_title,
-                "prop": "sections|text",
+                "prop": "text",
+                # formatversion=2 下 text 直接是HTML字符串
+                "formatversion": 2,
             }
             
-            self.logger.debug(f"获取页面内容参数: {content_params}")
+            self.logger.debug("正在搜索维基百科: %s", name)
+            self.logger.debug("搜索URL: %s", search_url)
+            self.logger.debug("搜索参数: %s", search_params)
             
-            async with session.get(search_url, params=content_params) as response:
-                content_data = await response.json()     
-
-            html_text = content_data["parse"]["text"]
-            if isinstance(html_text, dict) and "*" in html_text:
-                html_content = html_text["*"]
-            elif isinstance(html_text, str):
-                html_content = html_text
-            else:
-                self.logger.debug(f"意外的text类型: {type(html_text)}")
-                html_content = str(html_text)
+            # 搜索的同时，推测输入的名字本身就是页面标题（含重定向）并直接请求页面内容；
+            # 推测命中时省去一次串行往返，未命中再按搜索结果请求
+            search_task = asyncio.create_task(self._fetch_json(session, search_url, search_params))
+            speculative_task = asyncio.create_task(
+                self._fetch_json(session, search_url, {**content_params, "page": name, "redirects": 1})
+            )
+            try:
+                content_data = await speculative_task
+            except Exception as e:
+                self.logger.debug("推测请求页面内容失败: %s", e)
+                content_data = None
+            
+            # 推测的页面只有含"生平"段落时才直接采用；否则（如消歧义页）仍按搜索排名选择页面，
+            # 已下载的页面内容在其出现在搜索结果中时复用，不再重复请求
+            biography_section = None
+            prefetched = {}
+            if content_data and content_data.get("parse"):
+                page_title = content_data["parse"]["title"]
+                # 搜索通常先于页面内容返回，已完成时顺便取得页面的最后修改时间用于按标题缓存
+                page_cache_key = None
+                if search_task.done() and not search_task.cancelled() and search_task.exception() is None:
+                    hits = search_task.result().get("query", {}).get("search", [])
+                    timestamps = {hit["title"]: hit.get("timestamp", "") for hit in hits}
+                    if page_title in timestamps:
+                        page_cache_key = _hashed_key("wiki_page", language, page_title, timestamps[page_title])
+                        cached_section = await self.cache.get(page_cache_key)
+                        if cached_section:
+                            self.logger.info(f"从缓存获取页面 {page_title} 的内容")
+                            self._cache_in_background(self.cache.set(wiki_cache_key, cached_section, expire=self.WIKI_CACHE_EXPIRE))
+                            return cached_section
+                
+                html_content = self._page_html(content_data)
+                # 解析整页HTML是数十毫秒的纯CPU工作，放到线程中执行，不阻塞其他请求
+                biography_section = await asyncio.to_thread(HTMLParser.extract_section_by_id, html_content, "生平")
+                if biography_section:
+                    self.logger.debug("直接命中页面: %s", page_title)
+                    if not search_task.done():
+                        search_task.cancel()
+                else:
+                    self.logger.debug("推测的页面 %s 没有生平段落，改用搜索结果", page_title)
+                    prefetched[page_title] = html_content
+            
+            if not biography_section:
+                search_data = await search_task
+                
+                # 完整搜索结果的序列化开销不小，仅在实际输出DEBUG日志时执行
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug(f"搜索结果: {orjson.dumps(search_data, option=orjson.OPT_INDENT_2).decode('utf-8')}")
+                
+                if not search_data.get("query", {}).get("search"):
+                    log_and_raise_error(
+                        error_type=WikipediaError,
+                        message=f"在维基百科中未找到 {name} 的相关信息",
+                        error_code="NO_SEARCH_RESULTS",
+                        details={"name": name, "language": language}
+                    )
+                
+                # 获取最相关的页面标题
+                hits = search_data["query"]["search"]
+                page_title = hits[0]["title"]
+                self.logger.debug("找到页面: %s", page_title)
+                
+                # 不同的名字（如简繁体、别名）可能指向同一页面，按页面标题再缓存一层；
+                # 键中包含搜索结果给出的最后修改时间，页面被编辑后自然失效
+                timestamps = {hit["title"]: hit.get("timestamp", "") for hit in hits}
+                page_cache_key = _hashed_key("wiki_page", language, page_title, timestamps[page_title])
+                cached_section = await self.cache.get(page_cache_key)
+                if cached_section:
+                    self.logger.info(f"从缓存获取页面 {page_title} 的内容")
+                    self._cache_in_background(self.cache.set(wiki_cache_key, cached_section, expire=self.WIKI_CACHE_EXPIRE))
+                    return cached_section
+                
+                # 2. 获取页面内容：前两个搜索结果并发请求，优先使用含"生平"段落的页面
+                titles = [hit["title"] for hit in hits[:2]]
+                to_fetch = [title for title in titles if title not in prefetched]
+                self.logger.debug("获取页面内容: %s", to_fetch)
+                pages = await asyncio.gather(
+                    *(self._fetch_json(session, search_url, {**content_params, "page": title}) for title in to_fetch),
+                    return_exceptions=True
+                )
+                fetched = dict(zip(to_fetch, pages))
+                
+                candidates = []
+                for title in titles:
+                    if title in prefetched:
+                        # 推测请求已取得且确认没有"生平"段落
+                        candidates.append((title, prefetched[title], None))
+                        continue
+                    page = fetched[title]
+                    if isinstance(page, Exception) or not page.get("parse"):
+                        self.logger.debug("获取页面 %s 失败: %s", title, page)
+                        continue
+                    page_html = self._page_html(page)
+                    section = await asyncio.to_thread(HTMLParser.extract_section_by_id, page_html, "生平")
+                    candidates.append((title, page_html, section))
+                    if section:
+                        break
+                if not candidates:
+                    raise ValueError(f"无法获取页面内容: {titles}")
+                
+                # 都没有"生平"段落时使用最相关的页面
+                page_title, html_content, biography_section = candidates[-1] if candidates[-1][2] else candidates[0]
+                page_cache_key = _hashed_key("wiki_page", language, page_title, timestamps[page_title])
             
-            # Try to extract biography section, fallback to full content
-            biography_section = HTMLParser.extract_section_by_id(html_content, "生平")
             if not biography_section:
                 # If no specific biography section, extract all readable text
-                biography_section = HTMLParser.extract_all_text(html_content)
+                biography_section = await asyncio.to_thread(HTMLParser.extract_all_text, html_content)
             
-            return biography_section if biography_section else html_content
+            wiki_content = biography_section if biography_section else html_content
+            cache_items = {wiki_cache_key: wiki_content}
+            if page_cache_key is not None:
+                cache_items[page_cache_key] = wiki_content
+            self._cache_in_background(self.cache.set_many(cache_items, expire=self.WIKI_CACHE_EXPIRE))
+            return wiki_content
             
         except Exception as e:
             log_and_raise_error(
@@ -221,10 +542,26 @@ class BiographyService(BaseService):
             )
 
     
+    @staticmethod
+    def _page_html(content_data: Dict[str, Any]) -> str:
+        """从 parse 接口（formatversion=2）的响应中取出页面HTML"""
+        return content_data["parse"]["text"]
+    
+    @staticmethod
+    async def _fetch_json(session, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """发送GET请求并用 orjson 解析响应体"""
+        async with session.get(url, params=params) as response:
+            return orjson.loads(await response.read())
+    
     async def search_suggestions(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """
         搜索建议（自动补全功能）
         """
+        cache_key = _hashed_key("suggest", query, str(limit))
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         session = await self.get_session()
         
         try:
@@ -236,21 +573,24 @@ class BiographyService(BaseService):
                 "limit": limit
             }
             
-            async with session.get(search_url, params=params) as response:
-                data = await response.json()
+            data = await self._fetch_json(session, search_url, params)
             
-            suggestions = []
-            if len(data) >= 2:
-                titles = data[1]
-                descriptions = data[2] if len(data) > 2 else []
-                
-                for i, title in enumerate(titles):
-                    suggestions.append({
-                        "name": title,
-                        "description": descriptions[i] if i < len(descriptions) else "",
-                        "popularity": 1.0 - (i * 0.1)  # 简单的流行度计算
-                    })
+            titles = data[1] if len(data) >= 2 else []
+            descriptions = data[2] if len(data) > 2 else []
+            # 描述数量可能少于标题数量，不足部分补空字符串
+            descriptions = descriptions[:len(titles)] + [""] * (len(titles) - len(descriptions))
             
+            # 简单的流行度计算：按排名从 1 线性递减，不低于 0
+            step = 1.0 / max(limit, 1)
+            suggestions = [
+                {
+                    "name": title,
+                    "description": description,
+                    "popularity": max(0.0, 1.0 - i * step)
+                }
+                for i, (title, description) in enumerate(zip(titles, descriptions))
+            ]
+            self._cache_in_background(self.cache.set(cache_key, suggestions, expire=self.SUGGESTION_CACHE_EXPIRE))
             return suggestions
             
         except Exception as e:
@@ -276,7 +616,7 @@ class BiographyService(BaseService):
                 message=user_prompt,
                 system_prompt=LIFE_TRAJECTORY_PROMPT
             )
-            trajectory_data = json.loads(response)
+            trajectory_data = orjson.loads(response)
             return trajectory_data
         except Exception as e:
             raise Exception(f"提取轨迹信息失败: {str(e)}")
@@ -298,47 +638,72 @@ class BiographyService(BaseService):
                 message=user_prompt,
                 system_prompt=LIFE_TRAJECTORY_WITH_COORDINATES_PROMPT
             )
-            trajectory_data = json.loads(response)
+            trajectory_data = orjson.loads(response)
             return trajectory_data
         except Exception as e:
             raise Exception(f"提取轨迹和坐标信息失败: {str(e)}")
 
-    async def get_city_coordinates(self, places: List[str]) -> str:
-        # 将places列表中的元素用逗号分隔
-        places_str = "、".join(places)
-        user_prompt = f"请提供以下城市或地点的坐标信息：{places_str}"
+    async def get_city_coordinates(self, places: List[str]) -> Dict[str, Any]:
+        """
+        获取地点坐标
         
-        response = await self.llm_client.chat(
-            message=user_prompt,
-            system_prompt=CITY_COORDINATES_PROMPT
-        )
-        coord_data = json.loads(response)
-        return coord_data
+        地点坐标几乎不会变化，按地点单独长期缓存，只对未命中的地点调用LLM；
+        并发请求的地点查询会在短时间窗口内合并为一次LLM调用
+        
+        Returns:
+            {"locations": [...]}，每项的 city 为请求中的地点名
+        """
+        keys = {place: _hashed_key("coord", place) for place in places}
+        cached = await self.cache.get_many(keys.values())
+        found = {place: cached[key] for place, key in keys.items() if cached.get(key)}
+        
+        missing = [place for place in keys if place not in found]
+        if missing:
+            coord_data = await self._coord_batcher.process(missing)
+            fetched = {location["city"]: location for location in coord_data["locations"]}
+            if fetched:
+                self._cache_in_background(self.cache.set_many(
+                    {keys[place]: location for place, location in fetched.items()},
+                    expire=self.COORD_CACHE_EXPIRE
+                ))
+            found.update(fetched)
+        
+        return {"locations": [found[place] for place in places if place in found]}
 
     async def _parse_mode_1(self, biography_text: str) -> Dict[str, Any]:
         """
-        模式1：串行调用（1+N次请求）
-        先解析生平，再逐个解析地点坐标
+        模式1：分步调用（1+1次请求）
+        先解析生平，再一次性解析全部地点坐标
         """
         # 第一步：提取轨迹信息
         trajectory_data = await self.extract_life_trajectory(biography_text)
+        trajectories = trajectory_data["trajectory"]
         
-        # 第二步：逐个获取地点坐标
-        for trajectory in trajectory_data["trajectory"]:
-            place = trajectory.get("place", "")
-            if place:
-                # 为每个地点单独调用LLM获取坐标
-                coord_response = await self.get_city_coordinates([place])
-                if coord_response and len(coord_response) > 0:
-                    coords = coord_response[0]
-                    trajectory["coordinates"] = {
+        # 第二步：去重后的全部地点合并为一次坐标请求，结果与输入顺序一致
+        places = list(dict.fromkeys(t["location"] for t in trajectories if t.get("location")))
+        place_coordinates = {}
+        if places:
+            try:
+                coord_response = await self.get_city_coordinates(places)
+                locations = coord_response.get("locations") or []
+                if len(locations) == len(places):
+                    matched = zip(places, locations)
+                else:
+                    # 数量不一致时无法按顺序对应，改用返回的城市名匹配
+                    self.logger.warning(f"坐标数量({len(locations)})与地点数量({len(places)})不一致，按名称匹配")
+                    matched = ((location.get("city"), location) for location in locations)
+                for place, coords in matched:
+                    place_coordinates[place] = {
                         "longitude": coords.get("longitude", 0),
                         "latitude": coords.get("latitude", 0)
                     }
-                else:
-                    trajectory["coordinates"] = {"longitude": 0, "latitude": 0}
-            else:
-                trajectory["coordinates"] = {"longitude": 0, "latitude": 0}
+            except Exception as e:
+                self.logger.warning(f"获取地点坐标失败: {str(e)}")
+        
+        for trajectory in trajectories:
+            trajectory["coordinates"] = place_coordinates.get(
+                trajectory.get("location", ""), {"longitude": 0, "latitude": 0}
+            )
         
         return trajectory_data
 
@@ -355,7 +720,9 @@ class BiographyService(BaseService):
         将生平数据按自然段分隔，并发调用LLM解析
         """
         # 按自然段（空行）分隔文本
-        raw_paragraphs = [p.strip() for p in biography_text.split('\n\n') if p.strip()]
+        # 去除内容完全相同的段落（只保留首次出现的），重复的样板段落不再重复调用LLM；
+        # 重复段落提取出的轨迹点也是重复的，因此无需把结果展开回原位置
+        raw_paragraphs = list(dict.fromkeys(p.strip() for p in _PARA_RE.split(biography_text) if p.strip()))
         
         if not raw_paragraphs:
             # 如果没有自然段分隔，回退到模式2
@@ -369,41 +736,61 @@ class BiographyService(BaseService):
         # 根据段落数量动态计算每段轨迹数量限制
         max_trajectories_per_paragraph = max(1, min(10, 30 // len(paragraphs)))
         
-        # 为每个段落创建prompt
-        prompts = []
-        for i, paragraph in enumerate(paragraphs):
-            # 在原始prompt基础上添加轨迹数量限制规则
-            enhanced_prompt = LIFE_TRAJECTORY_WITH_COORDINATES_PROMPT + f"\n\n重要规则：由于这是分段解析，请严格控制输出的轨迹点数量不超过{max_trajectories_per_paragraph}个，优先选择最重要的轨迹点。"
-            
-            prompt = f"请分析以下人物生平片段，提取轨迹数据和坐标信息（段落{i+1}）：\n\n{paragraph}"
-            prompts.append({
-                "message": prompt,
-                "system_prompt": enhanced_prompt
-            })
-
+        # 每K个段落合并为一次请求，减少请求数，避免受限于服务商的每分钟请求数上限
+        system_prompt = _batch_system_prompt(max_trajectories_per_paragraph)
+        prompts = [
+            {"message": self._row_marshal_paragraphs(paragraphs[start:start + self.PARAGRAPHS_PER_REQUEST], start),
+             "system_prompt": system_prompt}
+            for start in range(0, len(paragraphs), self.PARAGRAPHS_PER_REQUEST)
+        ]
         
         # 并发调用LLM
         responses = await self.llm_client.chat_batch(prompts)
         
         self.logger.info(f"LLM响应数: {len(responses)}")
 
+        # 解析和合并响应在工作线程中完成，大批量响应时不阻塞事件循环处理其他请求
+        return await asyncio.to_thread(self._merge_batch_responses, responses)
+    
+    def _merge_batch_responses(self, responses: List[Any]) -> Dict[str, Any]:
+        """
+        解析模式3各批次的LLM响应并合并为一条轨迹
+        
+        Args:
+            responses: chat_batch 返回的响应列表，失败的请求为异常对象
+        """
+        # 所有批次都失败时（如LLM不可用、密钥无效）直接报错，部分失败时合并其余批次
+        failures = [response for response in responses if isinstance(response, Exception)]
+        if failures and len(failures) == len(responses):
+            raise failures[0]
+        
         # 合并所有响应结果
         merged_trajectory = {
             "person_name": "",
             "trajectory": []
         }
 
-        for response in responses:
+        for i, response in enumerate(responses):
+            if isinstance(response, Exception):
+                self.logger.warning(f"批次{i+1}请求失败: {str(response)}")
+                continue
             try:
                 if response:
-                    data = json.loads(response)
+                    data = orjson.loads(response)
                     if not merged_trajectory["person_name"] and data.get("person_name"):
                         merged_trajectory["person_name"] = data["person_name"]
                     
-                    if "trajectory" in data and isinstance(data["trajectory"], list):
+                    # 依次展开各段落的轨迹
+                    results = data.get("results")
+                    if isinstance(results, list):
+                        for result in results:
+                            if isinstance(result, dict) and isinstance(result.get("trajectory"), list):
+                                merged_trajectory["trajectory"].extend(result["trajectory"])
+                    elif isinstance(data.get("trajectory"), list):
+                        # 模型未按段落分组时直接使用顶层轨迹
                         merged_trajectory["trajectory"].extend(data["trajectory"])
-            except (json.JSONDecodeError, TypeError) as e:
-                self.logger.warning(f"解析段落响应失败: {str(e)}")
+            except (orjson.JSONDecodeError, TypeError) as e:
+                self.logger.warning(f"解析批次响应失败: {str(e)}")
                 continue
         
         # 如果没有获取到人名，使用原始输入
@@ -412,6 +799,20 @@ class BiographyService(BaseService):
         
         return merged_trajectory
     
+    @staticmethod
+    def _row_marshal_paragraphs(paragraphs: List[str], offset: int = 0) -> str:
+        """
+        将多个段落编号后拼接为一条消息
+        
+        Args:
+            paragraphs: 段落列表
+            offset: 第一个段落在全部段落中的下标，用于生成全局连续的段落编号
+        """
+        body = "\n===\n".join(
+            f"段落{offset + i + 1}:\n{paragraph}" for i, paragraph in enumerate(paragraphs)
+        )
+        return _BATCH_MESSAGE_PREFIX + body
+    
     async def _parse_mode_4(self, wiki_data: str) -> Dict[str, Any]:
         """
         模式4：使用LangChain智能解析
@@ -423,20 +824,21 @@ class BiographyService(BaseService):
         Returns:
             包含trajectory的字典
         """
-        if not self._langchain_processor:
-            self.logger.warning("LangChain处理器未初始化，回退到模式3")
+        processor = await self._get_langchain()
+        if processor is None:
+            self.logger.warning("LangChain处理器不可用，回退到模式3")
             return await self._parse_mode_3(wiki_data)
             
         try:
             self.logger.info("开始使用LangChain模式4处理生平数据")
             
             # 使用LangChain处理器处理文档
-            result = await self._langchain_processor.process_biography(wiki_data)
+            result = await processor.process_biography(wiki_data)
             
             # 验证结果格式
             if not isinstance(result, dict):
                 raise ValueError("LangChain处理器返回格式错误")
-            self.logger.info(result)
+            self.logger.debug("LangChain处理结果: %s", result)
             # 提取LangChain处理器返回的数据结构
             life_trajectory_data = result.get('life_trajectory', {})
             
@@ -470,7 +872,7 @@ class BiographyService(BaseService):
     
     def _merge_short_paragraphs(self, paragraphs: List[str]) -> List[str]:
         """
-        合并较短的段落与后一段
+        将较短的段落与后续段落合并，直到合并后的长度达到阈值
         
         Args:
             paragraphs: 原始段落列表
@@ -480,24 +882,4 @@ class BiographyService(BaseService):
         """
         if not paragraphs:
             return paragraphs
-            
-        merged = []
-        i = 0
-        
-        while i < len(paragraphs):
-            current_paragraph = paragraphs[i]
-            
-            # 如果当前段落较短且不是最后一段，则与下一段合并
-            if (len(current_paragraph) < self.MIN_PARAGRAPH_LENGTH and 
-                i < len(paragraphs) - 1):
-                # 与下一段合并
-                next_paragraph = paragraphs[i + 1]
-                merged_paragraph = current_paragraph + "\n\n" + next_paragraph
-                merged.append(merged_paragraph)
-                i += 2  # 跳过下一段，因为已经合并了
-            else:
-                # 段落足够长或是最后一段，直接添加
-                merged.append(current_paragraph)
-                i += 1
-                
-        return merged
+        return _merge_paragraphs(paragraphs, self.MIN_PARAGRAPH_LENGTH)
@@ -12,9 +12,9 @@ LifeTracer Backend 启动脚本
 """
 
 import argparse
+import importlib.util
 import os
 import sys
-import uvicorn
 from pathlib import Path
 
 # 添加项目根目录到Python路径
@@ -85,22 +85,15 @@ def parse_args():
     return parser.parse_args()
 
 def check_dependencies():
-    """检查依赖是否安装"""
+    """检查依赖是否安装（只查找模块位置，不执行导入）"""
     required_packages = [
         'fastapi',
         'uvicorn',
         'pydantic',
-        'aiohttp',
-        'aiofiles'
+        'aiohttp'
     ]
     
-    missing_packages = []
-    
-    for package in required_packages:
-        try:
-            __import__(package)
-        except ImportError:
-            missing_packages.append(package)
+    missing_packages = [package for package in required_packages if importlib.util.find_spec(package) is None]
     
     if missing_packages:
         logger.error(f"❌ 缺少以下依赖包: {', '.join(missing_packages)}")
@@ -119,7 +112,7 @@ def check_config(config_file):
 def setup_environment():
     """设置环境"""
     # 创建必要的目录
-    directories = ['logs', 'cache']
+    directories = [os.environ.get('LOG_DIR', 'logs'), os.environ.get('CACHE_DIR', 'cache')]
     
     for directory in directories:
         if not os.path.exists(directory):
@@ -164,13 +157,15 @@ def main():
     # 打印启动信息
     print_startup_info(config, host, port, is_prod)
     
-    # 启动服务器
+    # 启动服务器（uvicorn 导入开销较大，仅在实际启动时导入）
+    import uvicorn
     if is_prod:
         # 生产模式
         uvicorn.run(
             "main:app",
             host=host,
             port=port,
+            app_dir=str(project_root),
             workers=args.workers,
             log_level=args.log_level,
             access_log=True
@@ -181,7 +176,9 @@ def main():
             "main:app",
             host=host,
             port=port,
+            app_dir=str(project_root),
             reload=args.reload or True,
+            reload_dirs=[str(project_root)],
             log_level=args.log_level,
             access_log=True
         )
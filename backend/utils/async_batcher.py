@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-batching helper for async calls
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, List, Optional, Set, Tuple
+
+
+class AsyncBatcher(ABC):
+    """
+    将短时间内到达的多个请求合并为一批处理
+
+    调用方通过 process(item) 提交请求并等待结果；批次达到 max_batch_size 或
+    第一个请求等待超过 max_queue_time 秒时，整批交给 process_batch 处理，
+    结果按顺序分发回各调用方。子类实现 process_batch。
+    """
+
+    def __init__(self, max_batch_size: int = 32, max_queue_time: float = 0.05):
+        """
+        Args:
+            max_batch_size: 单批最大请求数
+            max_queue_time: 请求在队列中的最长等待时间（秒）
+        """
+        self.max_batch_size = max_batch_size
+        self.max_queue_time = max_queue_time
+        self._queue: List[Tuple[Any, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # 进行中的批处理任务，保持引用防止被垃圾回收
+        self._tasks: Set[asyncio.Task] = set()
+
+    @abstractmethod
+    async def process_batch(self, batch: List[Any]) -> List[Any]:
+        """
+        处理一批请求
+
+        Returns:
+            与 batch 等长、顺序一致的结果列表
+        """
+
+    async def process(self, item: Any) -> Any:
+        """提交一个请求并等待其结果"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((item, future))
+
+        if len(self._queue) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_queue_time, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """取出当前队列作为一批，交给后台任务处理"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._queue = self._queue, []
+        if not batch:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            results = await self.process_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            # 调用方可能已取消等待
+            if not future.done():
+                future.set_result(result)
@@ -1,14 +1,49 @@
+import os
+from typing import Any
+
+import orjson
+
+
 class Config:
     """配置管理类"""
-    
+
     def __init__(self, config_file: str = "config.json"):
         self.config_file = config_file
         self.config_data = {}
+        # 上次加载时配置文件的修改时间，文件未变化时跳过重新解析
+        self._mtime = 0.0
         self.load_config()
-    
+
     def load_config(self):
-        """加载配置文件"""
-        
+        """加载配置文件，文件未修改时直接返回"""
+        try:
+            mtime = os.stat(self.config_file).st_mtime
+        except FileNotFoundError:
+            self.config_data = {}
+            self._mtime = 0.0
+            return
+
+        if mtime == self._mtime:
+            return
+
+        with open(self.config_file, 'rb') as f:
+            self.config_data = orjson.loads(f.read())
+        self._mtime = mtime
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        获取配置项，支持点号分隔的嵌套键（如 "app.port"）
+
+        每次调用都会检查配置文件是否被修改，未修改时只有一次 stat 的开销
+        """
+        self.load_config()
+        value = self.config_data
+        for part in key.split('.'):
+            if not isinstance(value, dict) or part not in value:
+                return default
+            value = value[part]
+        return value
+
 # 全局配置实例
 _config_instance = None
 
@@ -23,4 +58,4 @@ def init_config(config_file: str = "config.json") -> Config:
     """初始化配置"""
     global _config_instance
     _config_instance = Config(config_file)
-    return _config_instance
\ No newline at end of file
+    return _config_instance
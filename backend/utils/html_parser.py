@@ -2,12 +2,137 @@
 """
 Simplified HTML parsing utilities
 """
+import os
+import re
+from html.parser import HTMLParser as _TokenParser
 from bs4 import BeautifulSoup
-from typing import Optional
+from typing import List, Optional, Tuple
 from utils.logger import get_logger
 
+try:
+    import lxml.etree
+    import lxml.html
+except ImportError:  # Optional dependency, fall back to html.parser and the streaming locator
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # Optional dependency, fall back to lxml or BeautifulSoup
+    LexborHTMLParser = None
+
+# Section extraction tries selectolax (lexbor) first; set HTML_PARSER_SELECTOLAX=0 to disable it
+_USE_SELECTOLAX = LexborHTMLParser is not None and os.getenv("HTML_PARSER_SELECTOLAX", "1") != "0"
+
+# BeautifulSoup tree builder: lxml's C parser when available
+_SOUP_PARSER = 'lxml' if lxml is not None else 'html.parser'
+
 logger = get_logger(__name__)
 
+# Elements that never have a closing tag
+_VOID_ELEMENTS = frozenset({
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr',
+})
+
+# Block elements whose text belongs to a section
+_CONTENT_TAGS = frozenset({'p', 'div', 'ul', 'ol', 'li', 'table', 'blockquote'})
+
+# Elements without readable text
+_NON_CONTENT_TAGS = frozenset({'script', 'style', 'meta', 'link'})
+
+_NEWLINE_RE = re.compile('\n')
+
+
+def _is_heading_wrapper(tag: str, class_attr: Optional[str]) -> bool:
+    """Whether an h2's parent only wraps the heading (MediaWiki's div.mw-heading)"""
+    return tag == 'div' and 'mw-heading' in (class_attr or '').split()
+
+# Compiled once; the section id is bound as an XPath variable on each call
+_H2_BY_ID = lxml.etree.XPath('//h2[@id=$sid]') if lxml is not None else None
+
+
+class _SectionFound(Exception):
+    """Raised internally to stop tokenizing once the section end is known"""
+
+
+class _SectionLocator(_TokenParser):
+    """
+    Streaming locator for the HTML between an h2 section heading and the next h2
+    
+    Feeds the document in chunks and tracks open elements by source offset. The
+    section starts after the heading's container (or the heading itself when it
+    has no container) and ends at the sibling that contains the next h2.
+    """
+    
+    CHUNK_SIZE = 16 * 1024
+    
+    def __init__(self, html_content: str, section_id: str):
+        super().__init__(convert_charrefs=False)
+        self.html = html_content
+        self.section_id = section_id
+        # Offsets of line starts, used to turn getpos() into string offsets
+        self._line_starts = [0] + [m.end() for m in _NEWLINE_RE.finditer(html_content)]
+        # Open elements: (tag, start offset)
+        self._stack: List[Tuple[str, int]] = []
+        # Stack depth of the heading's container, while waiting for it to close
+        self._container_depth: Optional[int] = None
+        # Stack depth of the section's top-level siblings once content has started
+        self._sibling_depth: Optional[int] = None
+        self.start: Optional[int] = None
+        self.end: Optional[int] = None
+    
+    def _offset(self) -> int:
+        line, column = self.getpos()
+        return self._line_starts[line - 1] + column
+    
+    def locate(self) -> Optional[str]:
+        """Return the section fragment, or None if the heading is missing"""
+        try:
+            for i in range(0, len(self.html), self.CHUNK_SIZE):
+                self.feed(self.html[i:i + self.CHUNK_SIZE])
+            self.close()
+        except _SectionFound:
+            pass
+        if self.start is None:
+            return None
+        return self.html[self.start:self.end if self.end is not None else len(self.html)]
+    
+    def handle_starttag(self, tag, attrs):
+        offset = self._offset()
+        if tag == 'h2':
+            if self._sibling_depth is not None:
+                # Next section: stop at the sibling that contains this heading
+                depth = self._sibling_depth
+                self.end = self._stack[depth][1] if len(self._stack) > depth else offset
+                raise _SectionFound()
+            if self.start is None and self._container_depth is None and dict(attrs).get('id') == self.section_id:
+                if self._stack:
+                    self._container_depth = len(self._stack) - 1
+                else:
+                    # No container: content starts right after the heading closes
+                    self._container_depth = len(self._stack)
+        if tag not in _VOID_ELEMENTS:
+            self._stack.append((tag, offset))
+    
+    def handle_startendtag(self, tag, attrs):
+        # Self-closing tags never stay open
+        if tag == 'h2':
+            self.handle_starttag(tag, attrs)
+            self.handle_endtag(tag)
+    
+    def handle_endtag(self, tag):
+        # Pop up to the matching open element, tolerating unclosed children
+        for depth in range(len(self._stack) - 1, -1, -1):
+            if self._stack[depth][0] == tag:
+                del self._stack[depth:]
+                break
+        else:
+            return
+        if self._container_depth is not None and len(self._stack) == self._container_depth:
+            self.start = self.html.find('>', self._offset()) + 1
+            self._sibling_depth = self._container_depth
+            self._container_depth = None
+
 
 class HTMLParser:
     """Simplified HTML parser for Wikipedia content"""
@@ -17,6 +142,12 @@ class HTMLParser:
         """
         Extract content of a section by h2 id until the next h2 section
         
+        With selectolax the lexbor C parser builds the tree and the heading's
+        siblings are walked there; pages it fails on fall back to the next parser.
+        With lxml the heading is found by XPath and its siblings are walked in C.
+        Without either, a streaming tokenizer locates the section so that only
+        the fragment is built into a BeautifulSoup tree.
+        
         Args:
             html_content: HTML content string
             section_id: Target h2 tag id (e.g., "生平")
@@ -25,88 +156,112 @@ class HTMLParser:
             Extracted section text, empty string if not found
         """
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
-            return HTMLParser._extract_section_content(soup, section_id)
+            content_parts = None
+            if _USE_SELECTOLAX:
+                try:
+                    content_parts = HTMLParser._section_texts_selectolax(html_content, section_id)
+                except Exception as e:
+                    logger.debug("selectolax failed on section '%s', falling back: %s", section_id, e)
+            if content_parts is None:
+                content_parts = HTMLParser._section_texts_fallback(html_content, section_id)
+            if content_parts is None:
+                logger.debug("Section '%s' not found", section_id)
+                return ""
+            
+            result = "\n\n".join(content_parts).strip()
+            logger.debug("Extracted %d characters from section '%s'", len(result), section_id)
+            return result
         except Exception as e:
             logger.warning(f"Failed to extract section '{section_id}': {str(e)}")
             return ""
     
     @staticmethod
-    def _extract_section_content(soup: BeautifulSoup, section_id: str) -> str:
-        """Internal method to extract section content"""
-        # Find target h2 tag
-        target_h2 = soup.find('h2', {'id': section_id})
-        if not target_h2:
-            logger.debug(f"Section '{section_id}' not found")
-            return ""
-        
-        logger.debug(f"Found section: {target_h2.get_text()}")
+    def _section_texts_fallback(html_content: str, section_id: str) -> Optional[List[str]]:
+        """Collect section texts with lxml, or the streaming locator without it"""
+        if lxml is not None:
+            return HTMLParser._section_texts_lxml(html_content, section_id)
+        return HTMLParser._section_texts_streaming(html_content, section_id)
+    
+    @staticmethod
+    def _section_texts_selectolax(html_content: str, section_id: str) -> Optional[List[str]]:
+        """Collect section texts with selectolax; None if the heading is missing or the section is empty"""
+        tree = LexborHTMLParser(html_content)
+        selector_id = section_id.replace('\\', '\\\\').replace('"', '\\"')
+        h2 = tree.css_first(f'h2[id="{selector_id}"]')
+        if h2 is None:
+            return None
         
-        # Find starting point for content extraction
-        start_element = HTMLParser._find_content_start(target_h2)
-        if not start_element:
-            return ""
+        # Siblings of the heading's wrapper, or of the heading itself when it is not wrapped
+        container = h2.parent
+        wrapped = container is not None and _is_heading_wrapper(container.tag, container.attributes.get('class'))
+        node = container.next if wrapped else h2.next
         
-        # Extract content until next h2
         content_parts = []
-        current = start_element
-        
-        while current:
-            if HTMLParser._is_section_boundary(current):
+        while node is not None:
+            tag = node.tag
+            if tag == 'h2' or (tag == 'div' and node.css_first('h2') is not None):
                 break
-            
-            if HTMLParser._is_content_element(current):
-                text = HTMLParser._extract_clean_text(current)
-                if text:
+            if tag in _CONTENT_TAGS:
+                text = node.text(deep=True, separator='', strip=True)
+                if len(text) > 5:
                     content_parts.append(text)
-            
-            current = current.next_sibling
-        
-        result = "\n\n".join(content_parts).strip()
-        logger.debug(f"Extracted {len(result)} characters from section '{section_id}'")
-        return result
-    
-    @staticmethod
-    def _find_content_start(h2_element):
-        """Find the starting element for content extraction"""
-        # Try h2's parent container first, then h2 itself
-        container = h2_element.parent
-        return container.next_sibling if container else h2_element.next_sibling
+            node = node.next
+        return content_parts or None
     
     @staticmethod
-    def _is_section_boundary(element) -> bool:
-        """Check if element marks the start of a new section"""
-        if not element or not hasattr(element, 'name'):
-            return False
+    def _section_texts_lxml(html_content: str, section_id: str) -> Optional[List[str]]:
+        """Collect section texts with lxml; None if the heading is missing or the section is empty"""
+        root = lxml.html.fromstring(html_content)
+        headings = _H2_BY_ID(root, sid=section_id)
+        if not headings:
+            return None
         
-        # Direct h2 tag
-        if element.name == 'h2':
-            return True
+        # Siblings of the heading's wrapper, or of the heading itself when it is not wrapped
+        h2 = headings[0]
+        container = h2.getparent()
+        wrapped = container is not None and _is_heading_wrapper(container.tag, container.get('class'))
+        start = container if wrapped else h2
         
-        # Div containing h2 tag
-        if element.name == 'div' and element.find('h2'):
-            return True
+        content_parts = []
+        for element in start.itersiblings():
+            tag = element.tag
+            if not isinstance(tag, str):
+                continue  # Comments and processing instructions
+            if tag == 'h2' or (tag == 'div' and element.find('.//h2') is not None):
+                break
+            if tag in _CONTENT_TAGS:
+                text = ''.join(part.strip() for part in element.itertext())
+                if len(text) > 5:
+                    content_parts.append(text)
+        return content_parts or None
+    
+    @staticmethod
+    def _section_texts_streaming(html_content: str, section_id: str) -> Optional[List[str]]:
+        """Collect section texts with the streaming locator; None if the heading is missing"""
+        fragment = _SectionLocator(html_content, section_id).locate()
+        if fragment is None:
+            return None
         
-        return False
+        # Top-level nodes of the fragment are the siblings that follow the heading
+        soup = BeautifulSoup(fragment, _SOUP_PARSER)
+        content_parts = []
+        for element in soup.contents:
+            if HTMLParser._is_content_element(element):
+                text = HTMLParser._extract_clean_text(element)
+                if text:
+                    content_parts.append(text)
+        return content_parts
     
     @staticmethod
     def _is_content_element(element) -> bool:
         """Check if element contains relevant content"""
-        if not element or not hasattr(element, 'name'):
+        # Text nodes have no name; script/style/meta/link are not content tags either
+        name = getattr(element, 'name', None)
+        if name not in _CONTENT_TAGS:
             return False
         
-        # Skip non-content elements
-        if element.name in ['script', 'style', 'meta', 'link']:
-            return False
-        
-        # Include content elements
-        if element.name in ['p', 'div', 'ul', 'ol', 'li', 'table', 'blockquote']:
-            # Skip divs that contain h2 (section headers)
-            if element.name == 'div' and element.find('h2'):
-                return False
-            return True
-        
-        return False
+        # Skip divs that contain h2 (section headers)
+        return not (name == 'div' and element.find('h2'))
     
     @staticmethod
     def _extract_clean_text(element) -> str:
@@ -124,10 +279,10 @@ class HTMLParser:
         Fallback method to extract all readable text from HTML
         """
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
+            soup = BeautifulSoup(html_content, _SOUP_PARSER)
             
             # Remove script and style elements
-            for script in soup(["script", "style", "meta", "link"]):
+            for script in soup(_NON_CONTENT_TAGS):
                 script.decompose()
             
             # Get text and clean it up
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide shared HTTP session
+"""
+from typing import Optional
+
+import aiohttp
+
+try:
+    import brotli  # noqa: F401  aiohttp decodes br responses only when Brotli is installed
+    _ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    _ACCEPT_ENCODING = "gzip, deflate"
+
+# Wikimedia's User-Agent policy asks clients to identify themselves
+_DEFAULT_HEADERS = {
+    "Accept-Encoding": _ACCEPT_ENCODING,
+    "User-Agent": "LifeTracer/1.0",
+}
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """
+    Get or create the shared HTTP session
+    
+    All services reuse one connection pool, so consecutive requests to the same
+    host (e.g. Wikipedia search + parse) skip TCP/TLS setup even across service
+    instances.
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=100,
+            limit_per_host=20,
+            ttl_dns_cache=300,
+            keepalive_timeout=75,
+            enable_cleanup_closed=True
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=30, connect=5),
+            headers=_DEFAULT_HEADERS
+        )
+    return _session
+
+
+async def close_session():
+    """Close the shared HTTP session (called on application shutdown)"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
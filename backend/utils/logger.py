@@ -1,17 +1,53 @@
+import atexit
 import logging
 import os
+import queue
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
-from typing import Optional
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, List, Optional
+
+
+class _RoutingHandler(logging.Handler):
+    """按日志记录器名称将记录分发给各自的处理器（在后台线程中执行）"""
+    
+    def __init__(self):
+        super().__init__()
+        self.routes: Dict[str, List[logging.Handler]] = {}
+    
+    def emit(self, record: logging.LogRecord):
+        for handler in self.routes.get(record.name, ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+# 所有记录器共用一个队列：请求路径上只把记录放入队列，
+# 控制台输出和文件写入由后台线程中的 QueueListener 完成，不阻塞事件循环
+_log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+_router = _RoutingHandler()
+_listener: Optional[QueueListener] = None
+
+
+def _start_listener():
+    """启动后台日志线程（每个进程一次）"""
+    global _listener
+    if _listener is None:
+        _listener = QueueListener(_log_queue, _router)
+        _listener.start()
+        # 进程退出前写完队列中剩余的日志
+        atexit.register(_listener.stop)
+
 
 def setup_logger(
     name: str = "LifeTracer",
     log_level: str = "INFO",
-    log_dir: str = "logs",
+    log_dir: Optional[str] = None,
     max_file_size: int = 10 * 1024 * 1024,  # 10MB
     backup_count: int = 5
 ) -> logging.Logger:
-    """设置日志记录器"""
+    """设置日志记录器，未指定日志目录时使用 LOG_DIR 环境变量（默认 logs）"""
+    
+    if log_dir is None:
+        log_dir = os.environ.get('LOG_DIR', 'logs')
     
     # 确保日志目录存在
     if not os.path.exists(log_dir):
@@ -38,7 +74,6 @@ def setup_logger(
     console_handler = logging.StreamHandler()
     console_handler.setLevel(level)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
     
     # 文件处理器 - 所有日志
     log_file = os.path.join(log_dir, f"{name.lower()}.log")
@@ -50,7 +85,6 @@ def setup_logger(
     )
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
     
     # 错误日志文件处理器
     error_log_file = os.path.join(log_dir, f"{name.lower()}_error.log")
@@ -62,7 +96,11 @@ def setup_logger(
     )
     error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(formatter)
-    logger.addHandler(error_handler)
+    
+    # logger 上只挂 QueueHandler，实际的处理器由后台线程调用
+    _router.routes[name] = [console_handler, file_handler, error_handler]
+    logger.addHandler(QueueHandler(_log_queue))
+    _start_listener()
     
     # 防止日志重复
     logger.propagate = False
@@ -95,14 +133,14 @@ def log_function_call(func):
     """函数调用日志装饰器"""
     def wrapper(*args, **kwargs):
         logger = get_logger(func.__module__)
-        logger.debug(f"调用函数: {func.__name__}")
+        logger.debug("调用函数: %s", func.__name__)
         
         try:
             result = func(*args, **kwargs)
-            logger.debug(f"函数 {func.__name__} 执行成功")
+            logger.debug("函数 %s 执行成功", func.__name__)
             return result
         except Exception as e:
-            logger.error(f"函数 {func.__name__} 执行失败: {str(e)}")
+            logger.error("函数 %s 执行失败: %s", func.__name__, e)
             raise
     
     return wrapper
@@ -111,14 +149,14 @@ async def log_async_function_call(func):
     """异步函数调用日志装饰器"""
     async def wrapper(*args, **kwargs):
         logger = get_logger(func.__module__)
-        logger.debug(f"调用异步函数: {func.__name__}")
+        logger.debug("调用异步函数: %s", func.__name__)
         
         try:
             result = await func(*args, **kwargs)
-            logger.debug(f"异步函数 {func.__name__} 执行成功")
+            logger.debug("异步函数 %s 执行成功", func.__name__)
             return result
         except Exception as e:
-            logger.error(f"异步函数 {func.__name__} 执行失败: {str(e)}")
+            logger.error("异步函数 %s 执行失败: %s", func.__name__, e)
             raise
     
     return wrapper
@@ -146,7 +184,7 @@ class RequestLogger:
                           if k.lower() not in ['authorization', 'x-api-key']}
             log_data["headers"] = safe_headers
         
-        self.logger.info(f"API请求: {log_data}")
+        self.logger.info("API请求: %s", log_data)
     
     def log_response(self, status_code: int, response_time: float, error: str = None):
         """记录响应日志"""
@@ -158,9 +196,9 @@ class RequestLogger:
         
         if error:
             log_data["error"] = error
-            self.logger.error(f"API响应错误: {log_data}")
+            self.logger.error("API响应错误: %s", log_data)
         else:
-            self.logger.info(f"API响应成功: {log_data}")
+            self.logger.info("API响应成功: %s", log_data)
 
 # 全局请求日志记录器实例
 request_logger = RequestLogger()
\ No newline at end of file
@@ -0,0 +1,4 @@
+"""
+启动器模块
+start_dev.py（开发环境）和 start_production.py（Render部署）共用的启动逻辑
+"""
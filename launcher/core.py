@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+LifeTracer 启动逻辑
+
+run("dev") 启动开发环境一体化服务器（前后端一体）并打开浏览器；
+run("prod") 按Render Web Service的要求配置环境并启动服务
+"""
+
+import os
+import runpy
+import selectors
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# 添加backend目录到Python路径以导入logger
+_BACKEND_DIR = str(_PROJECT_ROOT / "backend")
+if _BACKEND_DIR not in sys.path:
+    sys.path.insert(0, _BACKEND_DIR)
+
+# 不切换工作目录，日志仍默认写入 backend/logs（须在首次获取日志记录器之前设置）
+os.environ.setdefault('LOG_DIR', os.path.join(_BACKEND_DIR, 'logs'))
+
+_logger = None
+
+def _log():
+    """获取日志记录器，首次使用时才导入和配置日志模块"""
+    global _logger
+    if _logger is None:
+        from utils.logger import get_logger
+        _logger = get_logger("launcher")
+    return _logger
+
+# 服务器停止（正常退出或 Ctrl-C）时置位，后台线程据此立即结束等待
+_SHUTDOWN = threading.Event()
+
+# 目录内容缓存，格式: {目录绝对路径: {文件名: os.DirEntry}}，每个目录只读取一次
+_FS_CACHE = {}
+
+# setup_environment 只执行一次，之后直接返回缓存的 (host, port)
+_ENV_READY = False
+_CACHED_HOSTPORT = None
+
+def _dir_index(path: Path) -> dict:
+    """读取目录内容（一次 scandir），目录不存在时返回空字典"""
+    key = str(path.resolve())
+    index = _FS_CACHE.get(key)
+    if index is None:
+        try:
+            with os.scandir(key) as entries:
+                index = {entry.name: entry for entry in entries}
+        except OSError:
+            index = {}
+        _FS_CACHE[key] = index
+    return index
+
+def cached_exists(path: Path, is_dir: bool = False) -> bool:
+    """通过父目录的缓存内容判断路径是否存在"""
+    entry = _dir_index(path.parent).get(path.name)
+    return entry is not None and (entry.is_dir() if is_dir else entry.is_file())
+
+def check_file_structure():
+    """检查文件结构"""
+    backend_dir = _PROJECT_ROOT / "backend"
+    frontend_dir = _PROJECT_ROOT / "frontend"
+
+    if not cached_exists(backend_dir, is_dir=True):
+        _log().error("❌ 后端目录不存在")
+        return False
+
+    if not cached_exists(frontend_dir, is_dir=True):
+        _log().error("❌ 前端目录不存在")
+        return False
+
+    # 检查关键文件
+    main_py = backend_dir / "main.py"
+    index_html = frontend_dir / "index.html"
+
+    if not cached_exists(main_py):
+        _log().error("❌ backend/main.py 不存在")
+        return False
+
+    if not cached_exists(index_html):
+        _log().error("❌ frontend/index.html 不存在")
+        return False
+
+    _log().info("✅ 项目结构检查通过")
+    return True
+
+def wait_for_port(host: str, port: int, timeout: float = 5.0) -> bool:
+    """
+    等待端口可连接，超时或服务器已停止时返回 False
+
+    非阻塞连接 + selectors 等待结果，失败后间隔20毫秒重试
+    """
+    deadline = time.monotonic() + timeout
+    with selectors.DefaultSelector() as selector:
+        while time.monotonic() < deadline:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                sock.setblocking(False)
+                sock.connect_ex((host, port))
+                selector.register(sock, selectors.EVENT_WRITE)
+                try:
+                    ready = selector.select(max(deadline - time.monotonic(), 0))
+                    if ready and sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                        return True
+                finally:
+                    selector.unregister(sock)
+            if _SHUTDOWN.wait(0.02):
+                return False
+    return False
+
+def check_redis_running():
+    """检查Redis是否正在运行（直接通过TCP发送PING，不依赖 redis-cli）"""
+    url = urlparse(os.environ.get('REDIS_URL', 'redis://localhost:6379'))
+    host = url.hostname or 'localhost'
+    port = url.port or 6379
+    try:
+        with socket.create_connection((host, port), timeout=0.3) as sock:
+            if url.scheme == 'rediss':
+                # TLS连接无法直接发送明文PING，能建立连接即视为可用
+                return True
+            sock.sendall(b'*1\r\n$4\r\nPING\r\n')
+            reply = sock.recv(64)
+        # 设置了密码的Redis会返回 NOAUTH 错误，同样说明服务正在运行
+        return reply.startswith(b'+PONG') or reply.startswith(b'-NOAUTH')
+    except OSError:
+        return False
+
+def start_redis_server():
+    """启动Redis服务器（生产环境）
+
+    注意：在Render等云平台上，此函数可能无法成功启动Redis服务，因为：
+    1. 云平台通常不支持运行系统级服务（systemctl、net start等）
+    2. 容器环境中没有预装Redis服务器
+    3. requirements.txt中的redis包只是Python客户端，不包含Redis服务器
+
+    解决方案：
+    - 配置使用外部Redis服务（Redis Cloud、Upstash等）
+    """
+    if check_redis_running():
+        _log().info("✅ Redis服务已在运行")
+        return True
+
+    # 在生产环境中，通常Redis应该作为系统服务运行
+    # 这里只做基本的启动尝试
+    _log().info("🔄 正在尝试启动Redis服务...")
+
+    try:
+        # 尝试启动Redis服务
+        if os.name == 'nt':
+            # Windows系统
+            try:
+                subprocess.run(['net', 'start', 'Redis'],
+                             capture_output=True, check=True)
+                _log().info("✅ Redis Windows服务启动成功")
+                return True
+            except subprocess.CalledProcessError:
+                _log().warning("⚠️ Redis Windows服务启动失败")
+        else:
+            # Linux系统 - 尝试systemctl启动
+            try:
+                subprocess.run(['systemctl', 'start', 'redis'],
+                             stdin=subprocess.DEVNULL, capture_output=True, check=True)
+                if wait_for_port('127.0.0.1', 6379):
+                    _log().info("✅ Redis systemd服务启动成功")
+                    return True
+            except (subprocess.CalledProcessError, FileNotFoundError):
+                # 如果systemctl不可用，尝试直接启动
+                try:
+                    subprocess.Popen(['redis-server'],
+                                   stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
+                    if wait_for_port('127.0.0.1', 6379):
+                        _log().info("✅ Redis服务器启动成功")
+                        return True
+                except FileNotFoundError:
+                    _log().warning("⚠️ 未找到Redis，请确保已安装Redis")
+                    return False
+
+        _log().warning("⚠️ Redis启动失败，将使用文件缓存")
+        return False
+
+    except Exception as e:
+        _log().warning(f"⚠️ Redis启动异常: {e}，将使用文件缓存")
+        return False
+
+def _run_subprocess(cmd):
+    """
+    运行子进程并等待结束，退出码非零时抛出 CalledProcessError
+
+    支持 posix_spawn 的平台上直接 spawn，省去 fork 复制父进程和关闭继承描述符的开销；
+    子进程与当前进程同属一个进程组，Ctrl-C 会同时送达子进程
+    """
+    if not hasattr(os, "posix_spawn"):
+        subprocess.run(cmd, check=True)
+        return
+
+    pid = os.posix_spawn(cmd[0], cmd, os.environ)
+    try:
+        _, status = os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        # 子进程同样收到了 SIGINT，等待其退出后再向上传递
+        os.waitpid(pid, 0)
+        raise
+    returncode = os.waitstatus_to_exitcode(status)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+def start_integrated_server(use_subprocess: bool = False):
+    """
+    启动一体化服务器（前后端一体）
+
+    默认在当前进程中运行 backend/start.py，省去再启动一个Python解释器；
+    use_subprocess 为 True 时（--subprocess）在子进程中运行。
+    不切换工作目录，backend 路径都以绝对路径传入
+    """
+    start_py = os.path.join(_BACKEND_DIR, "start.py")
+    server_args = [
+        "--host", "127.0.0.1", "--port", "8000", "--dev",
+        "--config", os.path.join(_BACKEND_DIR, "config.json"),
+    ]
+
+    _log().info("🚀 启动一体化服务器（前后端一体）...")
+    try:
+        if use_subprocess:
+            _run_subprocess([sys.executable, start_py, *server_args])
+        else:
+            sys.argv = [start_py, *server_args]
+            runpy.run_path(start_py, run_name="__main__")
+    except subprocess.CalledProcessError as e:
+        _log().error(f"❌ 服务器启动失败: {e}")
+        sys.exit(1)
+    except SystemExit as e:
+        # start.py 启动失败时以非零状态退出
+        if e.code not in (None, 0):
+            _log().error(f"❌ 服务器启动失败: 退出码 {e.code}")
+            sys.exit(1)
+    except KeyboardInterrupt:
+        _log().info("\n⏹️ 服务器已停止")
+
+def open_browser():
+    """服务器开始监听后打开浏览器"""
+    if not wait_for_port('127.0.0.1', 8000, timeout=10.0):
+        if _SHUTDOWN.is_set():
+            return
+        _log().warning("⚠️ 服务器 10 秒内未就绪，请稍后手动访问 http://localhost:8000")
+        return
+    import webbrowser
+    _log().info("🌍 正在打开浏览器...")
+    webbrowser.open('http://localhost:8000')  # 改为8000端口
+
+def _use_backend_cache_dir():
+    """不切换工作目录，文件缓存仍默认放在 backend/cache"""
+    os.environ.setdefault('CACHE_DIR', os.path.join(_BACKEND_DIR, 'cache'))
+
+def setup_environment():
+    """设置Render部署环境"""
+    global _ENV_READY, _CACHED_HOSTPORT
+    if _ENV_READY:
+        return _CACHED_HOSTPORT
+
+    # backend目录已在模块导入时加入Python路径
+    os.environ.setdefault('PYTHONPATH', _BACKEND_DIR)
+    _use_backend_cache_dir()
+
+    # 启动Redis服务（注意：在Render等云平台可能失败，会自动降级到文件缓存）
+    redis_started = start_redis_server()
+
+    # 设置Redis缓存环境变量
+    if redis_started:
+        os.environ.setdefault('CACHE_TYPE', 'redis')
+        # 生产环境Redis URL，如果没有设置则使用默认值
+        os.environ.setdefault('REDIS_URL', 'redis://localhost:6379')
+        _log().info(f"🔧 已启用Redis缓存: {os.environ.get('REDIS_URL')}")
+    else:
+        os.environ.setdefault('CACHE_TYPE', 'file')
+        _log().info("🔧 Redis不可用，使用文件缓存")
+
+    # Render会自动设置PORT环境变量
+    port = os.environ.get('PORT', '8000')
+    host = '0.0.0.0'  # Render要求绑定到0.0.0.0
+
+    _log().info(f"🌐 Render部署配置:")
+    _log().info(f"   Host: {host}")
+    _log().info(f"   Port: {port}")
+    _log().info(f"   Backend目录: {_BACKEND_DIR}")
+
+    _CACHED_HOSTPORT = (host, int(port))
+    _ENV_READY = True
+    return _CACHED_HOSTPORT
+
+def run_dev(argv):
+    """开发环境启动入口"""
+    _log().info("="*60)
+    _log().info("🎯 LifeTracer 开发环境启动器")
+    _log().info("📝 一体化部署：前后端通过同一服务器提供")
+    _log().info("="*60)
+
+    _use_backend_cache_dir()
+
+    # 设置Redis缓存环境变量（开发环境默认启用）
+    os.environ.setdefault('CACHE_TYPE', 'redis')
+    os.environ.setdefault('REDIS_URL', 'redis://localhost:6379')
+    _log().info("🔧 开发环境默认启用Redis缓存: redis://localhost:6379")
+
+    # 检查文件结构
+    if not check_file_structure():
+        sys.exit(1)
+
+    _log().info("🔧 准备启动一体化服务器...")
+    _log().info("📍 服务地址: http://localhost:8000")
+    _log().info("📚 API文档: http://localhost:8000/docs")
+    _log().info("🌐 前端页面: http://localhost:8000")
+    _log().info("")
+
+    try:
+        # 在后台线程打开浏览器
+        browser_thread = threading.Thread(target=open_browser, daemon=True)
+        browser_thread.start()
+
+        # 在主线程启动一体化服务器
+        start_integrated_server(use_subprocess="--subprocess" in argv)
+
+    except KeyboardInterrupt:
+        _SHUTDOWN.set()
+        _log().info("\n👋 正在停止服务...")
+        _log().info("✅ 服务已停止")
+        # 后台线程均为守护线程，无需等待其结束
+        sys.exit(0)
+    finally:
+        _SHUTDOWN.set()
+
+def run_prod(argv):
+    """Render启动入口"""
+    _log().info("🚀 LifeTracer Render部署启动中...")
+
+    # 设置环境
+    host, port = setup_environment()
+
+    # 导入并启动FastAPI应用
+    try:
+        import uvicorn
+        from main import app
+
+        _log().info("✅ 成功导入应用")
+        _log().info(f"📍 启动服务: http://{host}:{port}")
+
+        # 使用uvicorn启动，适合Render的配置
+        uvicorn.run(
+            app,
+            host=host,
+            port=port,
+            workers=1,  # Render推荐单worker
+            access_log=True,
+            log_level="info"
+        )
+
+    except Exception as e:
+        _log().error(f"❌ 启动失败: {e}")
+        sys.exit(1)
+
+_MODES = {
+    "dev": run_dev,
+    "prod": run_prod,
+}
+
+def run(mode: str, argv=None):
+    """
+    按模式启动
+
+    Args:
+        mode: "dev"（开发环境）或 "prod"（Render部署）
+        argv: 命令行参数，默认取 sys.argv[1:]
+    """
+    if mode not in _MODES:
+        raise ValueError(f"未知的启动模式: {mode}，可选: {', '.join(_MODES)}")
+    _MODES[mode](sys.argv[1:] if argv is None else argv)